@@ -0,0 +1,110 @@
+from concurrent.futures import ThreadPoolExecutor
+
+# Columns of the songs table that Song exposes as attributes
+SONG_FIELDS = (
+    "id", "title", "file_path", "thumbnail", "duration", "created_at",
+    "profile", "video_id", "original_title", "uploader", "tags", "play_count",
+    "file_size", "codec", "bitrate", "last_played", "missing",
+)
+
+
+class Song:
+    """One row of the songs table, by column name.
+
+    Columns the database doesn't have (yet) are None.
+    """
+
+    __slots__ = SONG_FIELDS
+
+    def __init__(self, **fields):
+        for name in SONG_FIELDS:
+            setattr(self, name, fields.get(name))
+
+    @classmethod
+    def from_row(cls, columns, row):
+        return cls(**dict(zip(columns, row)))
+
+    def __repr__(self):
+        return f"Song(id={self.id!r}, title={self.title!r})"
+
+
+def on_result(future, callback):
+    """Call callback with the future's result once it is done.
+
+    Errors are printed instead of raised. The callback runs on the
+    database thread (or right away if the future is already done), so it
+    should only update controls and call page.update().
+    """
+    def done(f):
+        try:
+            result = f.result()
+        except Exception as e:
+            print(f"Database error: {e}")
+            return
+        try:
+            callback(result)
+        except Exception as e:
+            print(f"Error in database callback: {e}")
+    future.add_done_callback(done)
+
+
+class AsyncDatabase:
+    """Non-blocking access to a Database for UI event handlers.
+
+    Every call is queued to one dedicated thread and returns a
+    concurrent.futures.Future right away, so a slow disk or a writer
+    holding the lock never freezes the window. Calls run in the order
+    they were made. Rows come back as Song records.
+
+    Use on_result() to handle the result from a callback, or
+    "await asyncio.wrap_future(future)" in an async handler.
+    """
+
+    def __init__(self, db):
+        self.db = db
+        self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="db")
+        self._columns = None
+
+    def submit(self, fn, *args, **kwargs):
+        """Run fn on the database thread; return a Future of its result."""
+        return self._executor.submit(fn, *args, **kwargs)
+
+    def get_song_by_path(self, file_path):
+        return self.submit(lambda: self._song(self.db.get_song_by_path(file_path)))
+
+    def get_song_by_video_id(self, video_id):
+        return self.submit(lambda: self._song(self.db.get_song_by_video_id(video_id)))
+
+    def get_songs_page(self, sort='created_at', after=None, limit=50, descending=None):
+        """Future of (songs, next_cursor); see Database.get_songs_page."""
+        def run():
+            rows, next_cursor = self.db.get_songs_page(sort, after, limit, descending)
+            return self._songs(rows), next_cursor
+        return self.submit(run)
+
+    def search_songs(self, query, limit=50):
+        return self.submit(lambda: self._songs(self.db.search_songs(query, limit)))
+
+    def set_songs_missing(self, song_ids, missing=True):
+        return self.submit(self.db.set_songs_missing, list(song_ids), missing)
+
+    def delete_songs(self, song_ids):
+        return self.submit(self.db.delete_songs, list(song_ids))
+
+    def close(self):
+        """Finish queued calls and stop the database thread."""
+        self._executor.shutdown(wait=True)
+
+    def _song(self, row):
+        return Song.from_row(self._song_columns(), row) if row else None
+
+    def _songs(self, rows):
+        columns = self._song_columns()
+        return [Song.from_row(columns, row) for row in rows]
+
+    def _song_columns(self):
+        # Column order of "SELECT *", which depends on the migrations applied
+        if self._columns is None:
+            cursor = self.db.get_connection().execute('PRAGMA table_info(songs)')
+            self._columns = [row[1] for row in cursor]
+        return self._columns
@@ -1,75 +1,65 @@
 import time
+import queue
 import threading
-import os
-import sys
-import ctypes
 
-# Global vlc import after DLL loading
-vlc = None
+from player_backends import VlcBackend
+
 
 class AudioPlayer:
-    def __init__(self):
-        # Get the directory where the script or executable is located
-        if getattr(sys, 'frozen', False):
-            # If running as a packaged executable
-            base_path = os.path.dirname(sys.executable)
-        else:
-            # If running as a script
-            base_path = os.path.dirname(os.path.abspath(__file__))
-        
-        # VLC folder in the "assets" directory next to the executable or script
-        vlc_path = os.path.join(base_path, 'assets', 'vlc')
-        
-        # Ensure the VLC folder exists
-        if not os.path.exists(vlc_path):
-            raise Exception(f"VLC directory not found at: {vlc_path}")
-
-        if sys.platform.startswith('win'):
-            # Add VLC directory to DLL search paths
-            os.add_dll_directory(vlc_path)
-            
-            # Load VLC DLLs from assets/vlc folder
-            libvlccore_path = os.path.join(vlc_path, 'libvlccore.dll')
-            libvlc_path = os.path.join(vlc_path, 'libvlc.dll')
-            
-            if not os.path.exists(libvlccore_path) or not os.path.exists(libvlc_path):
-                raise Exception("Required VLC DLLs not found in assets/vlc folder")
-            
-            # Load the DLLs
-            ctypes.CDLL(libvlccore_path)
-            ctypes.CDLL(libvlc_path)
-
-            # Add VLC plugins path to environment
-            plugin_path = os.path.join(vlc_path, 'plugins')
-            
-            # Set PATH environment variable to include VLC path for additional DLLs
-            os.environ['PATH'] = vlc_path + os.pathsep + os.environ['PATH']
-        else:
-            # Linux/Mac plugin path
-            plugin_path = os.path.join(vlc_path, 'plugins')
-
-        # Import VLC module globally after DLLs are loaded
-        global vlc
-        import vlc
-        
-        # Create VLC instance with plugin path
-        self.instance = vlc.Instance(
-            '--no-xlib',
-            f'--plugin-path={plugin_path}',
-        )
-        
-        self.player = self.instance.media_player_new()
+    def __init__(self, backend=None):
+        # VLC unless a different backend (e.g. NullBackend) is supplied
+        self.backend = backend or VlcBackend()
+
+        # Player events are handed to one long-lived dispatcher thread. VLC
+        # must not be called back from its own event thread, and the queue
+        # keeps the thread asleep while nothing is playing.
+        self._events = queue.Queue()
+
+        # Guards the players and playback state below. play(), stop() and
+        # seek() run on UI threads while the dispatcher switches players;
+        # callbacks are queued under the lock and run after it is released,
+        # so they can call back into the player.
+        self._lock = threading.RLock()
+        self._notifications = []
+
+        # Two media players: the active one and a standby that pre-opens the
+        # next track so queue transitions are gapless
+        self.player = self.backend.new_player(self._post_event)
+        self.standby = self.backend.new_player(self._post_event)
         self.current_file = None
+        self.current_media = None
         self.playing = False
         self.paused = False
+        self.volume = 0.5
+        self.duration = 0.0
         self.on_complete_callback = None
         self.on_position_update_callback = None
         self.on_duration_callback = None
-        self.monitor_thread = None
-        self.stop_monitoring = threading.Event()
-        
-        # Store VLC states
-        self.State = vlc.State
+        self.on_track_change_callback = None
+        self.next_track_provider = None
+
+        # Minimum seconds between position callbacks
+        self.position_interval = 0.1
+        # Seconds before the end of a track at which the next one is preloaded
+        self.preload_window = 5.0
+        # Seconds of crossfade between queue items (0 switches at end-of-stream)
+        self.crossfade = 0.0
+
+        self._preloaded = None  # (file_path, media) loaded on the standby player
+        # True while the standby is starting, silent, to be paused at 0
+        self._prerolling = False
+        self._fade_started = None
+
+        self._pending_position = None
+        self._last_position_emit = 0.0
+        self._dispatcher = threading.Thread(
+            target=self._dispatch_events, daemon=True, name="player-events"
+        )
+        self._dispatcher.start()
+
+    def _post_event(self, kind, value, source):
+        """Called from the backend's event thread; never calls back into it."""
+        self._events.put((kind, value, source))
 
     def set_on_complete_callback(self, callback):
         self.on_complete_callback = callback
@@ -80,84 +70,289 @@ class AudioPlayer:
     def set_on_duration_callback(self, callback):
         self.on_duration_callback = callback
 
-    def play(self, file_path):
-        """Play the specified audio file."""
+    def set_on_track_change_callback(self, callback):
+        """Called with the new file path when playback moves to a preloaded track."""
+        self.on_track_change_callback = callback
+
+    def set_next_track_provider(self, provider):
+        """provider() returns the file path that should play next, or None.
+
+        It is called near the end of each track and must not advance the
+        queue; the queue is advanced in the track change callback.
+        """
+        self.next_track_provider = provider
+
+    def set_crossfade(self, seconds):
+        self.crossfade = max(0.0, seconds)
+
+    def play(self, file_path, duration=None):
+        """Play the specified audio file.
+
+        Returns as soon as VLC has been told to start. duration (seconds),
+        e.g. the value stored in the library, is reported right away; the
+        real length follows through the duration callback once VLC has
+        parsed the file.
+        """
         try:
-            # Stop any ongoing playback and monitoring
-            self.stop_monitoring.set()
-            if self.monitor_thread and self.monitor_thread.is_alive():
-                self.stop_monitoring.clear()
-
-            self.current_file = file_path
-            self.current_media = self.instance.media_new(file_path)
-            self.player.set_media(self.current_media)
-            self.player.play()
-            self.playing = True
-            self.player.audio_set_volume(int(0.5 * 100))
-
-            # Wait for the player to load and retrieve duration
-            time.sleep(0.1)
-            duration = self.player.get_length() / 1000.0
-            if self.on_duration_callback:
-                self.on_duration_callback(duration)
-
-            # Restart monitoring for the new song
-            self.stop_monitoring.clear()
-            self._start_monitoring()
-            return True
+            with self._lock:
+                self._pending_position = None
+                self._cancel_preload()
+                self.current_file = file_path
+                self.current_media = self._open_media(file_path)
+                self.player.set_media(self.current_media)
+                self.player.play()
+                self.playing = True
+                self.paused = False
+                self.player.audio_set_volume(int(self.volume * 100))
+
+                self.duration = float(duration) if duration and duration > 0 else 0.0
+                if self.duration:
+                    self._notify(self.on_duration_callback, self.duration)
         except Exception as e:
             print(f"Error playing audio: {e}")
             return False
+        self._run_notifications()
+        return True
+
+    def _notify(self, callback, *args):
+        """Queue a callback to run once the player lock is released."""
+        if callback:
+            self._notifications.append((callback, args))
+
+    def _run_notifications(self):
+        with self._lock:
+            pending, self._notifications = self._notifications, []
+        for callback, args in pending:
+            try:
+                callback(*args)
+            except Exception as e:
+                print(f"Error in player callback: {e}")
+
+    def _open_media(self, file_path):
+        """Create a media; its parsed duration arrives as a 'length' event."""
+        return self.backend.open_media(file_path, self._post_event)
+
+    def _dispatch_events(self):
+        """Deliver player events to the callbacks, throttling position updates."""
+        while True:
+            timeout = None
+            if self._pending_position is not None:
+                timeout = max(
+                    0.0, self._last_position_emit + self.position_interval - time.monotonic()
+                )
+            if self._fade_started is not None:
+                # Step the crossfade volumes about 20 times a second
+                timeout = 0.05 if timeout is None else min(timeout, 0.05)
+            try:
+                kind, value, source = self._events.get(timeout=timeout)
+            except queue.Empty:
+                with self._lock:
+                    self._step_fade()
+                self._run_notifications()
+                if self._pending_position is not None:
+                    self._emit_position()
+                continue
+
+            if kind == 'close':
+                return
+            if kind == 'drain':
+                value.set()
+                continue
+            try:
+                with self._lock:
+                    self._handle_event(kind, value, source)
+            except Exception as e:
+                print(f"Error handling player event: {e}")
+            self._run_notifications()
+
+            # A steady stream of events must not hold back position updates
+            if (self._pending_position is not None
+                    and time.monotonic() - self._last_position_emit >= self.position_interval):
+                self._emit_position()
 
-    def _start_monitoring(self):
-        """Monitor playback state and invoke callbacks."""
-        def monitor_playback():
-            while not self.stop_monitoring.is_set():
-                if self.player.get_state() == self.State.Ended:  # Using stored State
-                    self.playing = False
-                    if self.on_complete_callback:
-                        self.on_complete_callback()
-                    break
-
-                if self.playing:
-                    position = self.player.get_time() / 1000.0
-                    if self.on_position_update_callback:
-                        self.on_position_update_callback(position)
-                time.sleep(0.1)
-
-        self.monitor_thread = threading.Thread(target=monitor_playback, daemon=True)
-        self.monitor_thread.start()
+    def _handle_event(self, kind, value, source):
+        """Apply one player event to the playback state; called with the lock held."""
+        if kind == 'playing':
+            if source is self.standby and self._prerolling:
+                # The next track is decoding with its output open;
+                # hold it at the start until the switch
+                self._prerolling = False
+                self.standby.set_pause(1)
+                self.standby.set_time(0)
+            return
+        if source is not self.player and source is not self.current_media:
+            # Events from the standby player while it preloads or fades in
+            return
+        if kind == 'position':
+            if self.playing:
+                self._pending_position = value / 1000.0
+                self._check_preload(value / 1000.0)
+        elif kind == 'length':
+            if value > 0 and abs(value / 1000.0 - self.duration) >= 0.001:
+                self.duration = value / 1000.0
+                self._notify(self.on_duration_callback, self.duration)
+        elif kind == 'end':
+            self._pending_position = None
+            if self._preloaded is not None:
+                self._switch_to_preloaded()
+            else:
+                self.playing = False
+                self._notify(self.on_complete_callback)
+
+    def drain(self, timeout=None):
+        """Block until every event queued so far has been handled."""
+        handled = threading.Event()
+        self._events.put(('drain', handled, None))
+        return handled.wait(timeout)
+
+    def _emit_position(self):
+        with self._lock:
+            position = self._pending_position
+            self._pending_position = None
+            self._last_position_emit = time.monotonic()
+            playing = self.playing
+        if position is not None and playing and self.on_position_update_callback:
+            try:
+                self.on_position_update_callback(position)
+            except Exception as e:
+                print(f"Error in player callback: {e}")
+
+    def _check_preload(self, position):
+        """Preload the next track, and start the crossfade, near the end."""
+        if self.duration <= 0:
+            return
+        remaining = self.duration - position
+        if self._preloaded is None and remaining <= max(self.preload_window, self.crossfade):
+            self._preload_next()
+        if (self._preloaded is not None and self.crossfade > 0
+                and self._fade_started is None and remaining <= self.crossfade):
+            self._prerolling = False
+            self.standby.audio_set_volume(0)
+            self.standby.set_pause(0)
+            self._fade_started = time.monotonic()
+
+    def _preload_next(self):
+        if not self.next_track_provider:
+            return
+        try:
+            file_path = self.next_track_provider()
+            if not file_path:
+                return
+            # Pre-roll on the standby player: start it silently so VLC opens
+            # the input, decoder and audio output now, then pause it at 0
+            # (see the 'playing' event) until the current track ends
+            media = self._open_media(file_path)
+            self.standby.set_media(media)
+            self.standby.audio_set_volume(0)
+            self.standby.play()
+            self._preloaded = (file_path, media)
+            self._prerolling = True
+        except Exception as e:
+            print(f"Error preloading next track: {e}")
+            self._preloaded = None
+
+    def _step_fade(self):
+        if self._fade_started is None:
+            return
+        progress = min((time.monotonic() - self._fade_started) / self.crossfade, 1.0)
+        self.player.audio_set_volume(int(self.volume * 100 * (1.0 - progress)))
+        self.standby.audio_set_volume(int(self.volume * 100 * progress))
+        if progress >= 1.0:
+            self._switch_to_preloaded()
+
+    def _switch_to_preloaded(self):
+        """Make the standby player active and report the track change."""
+        file_path, media = self._preloaded
+        fading = self._fade_started is not None
+        self._preloaded = None
+        self._prerolling = False
+        self._fade_started = None
+
+        previous = self.player
+        self.player, self.standby = self.standby, self.player
+        self.player.audio_set_volume(int(self.volume * 100))
+        if not fading:
+            # Unpause the pre-rolled player (or start it, if it hadn't got
+            # as far as playing yet)
+            self.player.set_pause(0)
+        previous.stop()
+
+        self.current_file = file_path
+        self.current_media = media
+        self.playing = True
+        self.paused = False
+
+        length = self.player.get_length()
+        if length <= 0:
+            length = media.get_duration()
+        if length > 0:
+            self.duration = length / 1000.0
+            self._notify(self.on_duration_callback, self.duration)
+        self._notify(self.on_track_change_callback, file_path)
+
+    def discard_preload(self):
+        """Forget the preloaded track, e.g. after the queue or loop mode changed."""
+        with self._lock:
+            fading = self._fade_started is not None
+            self._cancel_preload()
+            if fading:
+                self.player.audio_set_volume(int(self.volume * 100))
+
+    def _cancel_preload(self):
+        if self._preloaded is not None or self._fade_started is not None:
+            self.standby.stop()
+        self._preloaded = None
+        self._prerolling = False
+        self._fade_started = None
 
     def pause(self):
         """Pause the currently playing audio."""
-        if self.playing:
-            self.player.pause()
-            self.playing = False
-            self.paused = True
+        with self._lock:
+            if self.playing:
+                self.player.pause()
+                if self._fade_started is not None:
+                    self.standby.pause()
+                self.playing = False
+                self.paused = True
+                self._pending_position = None
 
     def resume(self):
         """Resume paused audio."""
-        if self.paused:
-            self.player.play()
-            self.playing = True
-            self.paused = False
-            self.stop_monitoring.clear()
-            self._start_monitoring()
+        with self._lock:
+            if self.paused:
+                self.player.play()
+                if self._fade_started is not None:
+                    self.standby.play()
+                self.playing = True
+                self.paused = False
 
     def stop(self):
         """Stop playback."""
-        self.stop_monitoring.set()
-        self.player.stop()
-        self.playing = False
-        self.paused = False
-        self.current_file = None
+        with self._lock:
+            self._cancel_preload()
+            self.player.stop()
+            self.playing = False
+            self.paused = False
+            self.current_file = None
+            self._pending_position = None
+
+    def close(self):
+        """Stop playback and shut down the event dispatcher."""
+        self.stop()
+        self._events.put(('close', None, None))
 
     def seek(self, position):
         """Seek to a position in seconds."""
-        if self.current_file:
-            self.player.set_time(int(position * 1000))
+        with self._lock:
+            if self.current_file:
+                if self._fade_started is not None or position < self.duration - self.preload_window:
+                    # Seeking away from the end drops a preloaded or fading track
+                    self.discard_preload()
+                self.player.set_time(int(position * 1000))
 
     def set_volume(self, volume):
         """Set the playback volume (0 to 1.0)."""
-        volume = max(0.0, min(volume, 1.0))
-        self.player.audio_set_volume(int(volume * 100))
\ No newline at end of file
+        with self._lock:
+            volume = max(0.0, min(volume, 1.0))
+            self.volume = volume
+            self.player.audio_set_volume(int(volume * 100))
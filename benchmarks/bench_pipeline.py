@@ -0,0 +1,231 @@
+"""Offline benchmark for the download -> convert -> thumbnail -> library pipeline.
+
+Generated audio fixtures are served from a local HTTP server, and a
+YouTubeDownloader subclass replaces YouTube extraction with fixture info,
+so nothing touches the network. Everything after extraction is the real
+code: DownloadManager, YouTubeDownloader.download / fetch_source,
+convert_to_mp3, download_thumbnail and Database.add_song.
+
+    python benchmarks/bench_pipeline.py --ffmpeg /usr/bin/ffmpeg --jobs 12 --max-workers 4
+
+Reports jobs/minute, MB/s and per-stage p50/p95 latency for each worker
+count from 1 to --max-workers.
+"""
+import os
+import sys
+import time
+import shutil
+import argparse
+import tempfile
+import threading
+import subprocess
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from database import Database  # noqa: E402
+from download_manager import DownloadManager, DownloadJob  # noqa: E402
+from transcoder import Transcoder  # noqa: E402
+from pipeline_stats import PipelineStats, STAGES  # noqa: E402
+from youtube_downloader import YouTubeDownloader  # noqa: E402
+
+CHUNK_SIZE = 64 * 1024
+
+
+def make_fixtures(ffmpeg_path, fixture_dir, count, seconds):
+    """Generate distinct Opus/WebM tones plus a small JPEG thumbnail."""
+    os.makedirs(fixture_dir, exist_ok=True)
+    for i in range(count):
+        path = os.path.join(fixture_dir, f"track_{i}.webm")
+        if os.path.exists(path):
+            continue
+        subprocess.run(
+            [
+                ffmpeg_path, '-hide_banner', '-loglevel', 'error', '-y',
+                '-f', 'lavfi', '-i', f"sine=frequency={220 + 20 * i}:duration={seconds}",
+                '-ac', '2', '-c:a', 'libopus', '-b:a', '128k', path,
+            ],
+            check=True,
+        )
+    thumbnail = os.path.join(fixture_dir, "thumbnail.jpg")
+    if not os.path.exists(thumbnail):
+        subprocess.run(
+            [
+                ffmpeg_path, '-hide_banner', '-loglevel', 'error', '-y',
+                '-f', 'lavfi', '-i', 'color=c=green:s=320x180', '-frames:v', '1', thumbnail,
+            ],
+            check=True,
+        )
+
+
+def make_handler(fixture_dir, bytes_per_second):
+    """HTTP handler serving fixture files with Range support and optional throttling."""
+
+    class FixtureHandler(BaseHTTPRequestHandler):
+        def log_message(self, format, *args):
+            pass
+
+        def do_HEAD(self):
+            self._serve(send_body=False)
+
+        def do_GET(self):
+            self._serve(send_body=True)
+
+        def _serve(self, send_body):
+            path = os.path.join(fixture_dir, os.path.basename(self.path.split('?')[0]))
+            if not os.path.isfile(path):
+                self.send_error(404)
+                return
+            size = os.path.getsize(path)
+            start, end = 0, size - 1
+            range_header = self.headers.get('Range')
+            if range_header and range_header.startswith('bytes='):
+                first, _, last = range_header[6:].partition('-')
+                start = int(first) if first else 0
+                end = min(int(last), size - 1) if last else size - 1
+                if start >= size:
+                    self.send_error(416)
+                    return
+                self.send_response(206)
+                self.send_header('Content-Range', f"bytes {start}-{end}/{size}")
+            else:
+                self.send_response(200)
+            self.send_header('Accept-Ranges', 'bytes')
+            self.send_header('Content-Length', str(end - start + 1))
+            self.send_header('Content-Type', 'image/jpeg' if path.endswith('.jpg') else 'audio/webm')
+            self.end_headers()
+            if not send_body:
+                return
+            with open(path, 'rb') as f:
+                f.seek(start)
+                remaining = end - start + 1
+                while remaining > 0:
+                    chunk = f.read(min(CHUNK_SIZE, remaining))
+                    if not chunk:
+                        break
+                    self.wfile.write(chunk)
+                    remaining -= len(chunk)
+                    if bytes_per_second:
+                        time.sleep(len(chunk) / bytes_per_second)
+
+    return FixtureHandler
+
+
+class FixtureDownloader(YouTubeDownloader):
+    """YouTubeDownloader whose extraction step returns fixture info."""
+
+    def __init__(self, base_url, fixture_dir, run_id, **kwargs):
+        super().__init__(**kwargs)
+        self.base_url = base_url
+        self.fixture_dir = fixture_dir
+        self.run_id = run_id
+
+    def get_video_info(self, url, refresh=False):
+        # URLs look like <base>/track_3.webm?n=17; n keeps every job distinct
+        path, _, query = url.partition('?')
+        name = os.path.basename(path)
+        stem = f"{os.path.splitext(name)[0]}_{query.partition('=')[2]}"
+        return {
+            'id': f"{self.run_id}_{stem}",
+            'title': self.sanitize_filename(f"{self.run_id} {stem}"),
+            'duration': 0,
+            'thumbnail': f"{self.base_url}/thumbnail.jpg",
+            'original_title': f"{self.run_id} {stem}",
+            'stream_url': url,
+            'http_headers': {},
+            'protocol': 'http',
+            'acodec': 'opus',
+            'filesize': os.path.getsize(os.path.join(self.fixture_dir, name)),
+            'filesize_approx': None,
+        }
+
+
+def run_once(args, base_url, fixture_dir, workdir, workers):
+    """Download every fixture with the given worker count; return the metrics."""
+    run_id = f"w{workers}"
+    db = Database(os.path.join(workdir, f"{run_id}.db"))
+    stats = PipelineStats(db)
+    downloader = FixtureDownloader(
+        base_url, fixture_dir, run_id,
+        streaming=args.mode == 'stream',
+        profile=args.profile,
+        stats=stats,
+        ffmpeg_path=args.ffmpeg,
+    )
+    transcoder = Transcoder(downloader) if args.mode == 'file' else None
+    manager = DownloadManager(downloader, db, max_workers=workers, transcoder=transcoder)
+
+    urls = [f"{base_url}/track_{i % args.fixtures}.webm?n={i}" for i in range(args.jobs)]
+    started = time.perf_counter()
+    jobs = [manager.submit(url) for url in urls]
+    while manager.active_jobs():
+        time.sleep(0.02)
+    elapsed = time.perf_counter() - started
+    manager.shutdown(wait=True)
+
+    failed = [job for job in jobs if job.status != DownloadJob.DONE]
+    source_bytes = sum(
+        os.path.getsize(os.path.join(fixture_dir, f"track_{i % args.fixtures}.webm"))
+        for i in range(args.jobs)
+    )
+    return {
+        'workers': workers,
+        'elapsed': elapsed,
+        'jobs_per_minute': (len(jobs) - len(failed)) / elapsed * 60,
+        'mb_per_second': source_bytes / elapsed / (1024 * 1024),
+        'failed': len(failed),
+        'stages': stats.summary(),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--ffmpeg', default=shutil.which('ffmpeg'), help="FFmpeg binary to use")
+    parser.add_argument('--jobs', type=int, default=12, help="downloads per worker count")
+    parser.add_argument('--fixtures', type=int, default=6, help="distinct audio fixtures")
+    parser.add_argument('--seconds', type=int, default=180, help="length of each fixture")
+    parser.add_argument('--max-workers', type=int, default=4)
+    parser.add_argument('--mode', choices=['stream', 'file'], default='stream')
+    parser.add_argument('--profile', default='mp3_192')
+    parser.add_argument('--bandwidth', type=float, default=0,
+                        help="per-connection limit in MB/s (0 = unlimited)")
+    args = parser.parse_args()
+
+    if not args.ffmpeg:
+        parser.error("FFmpeg not found; pass --ffmpeg")
+
+    workdir = tempfile.mkdtemp(prefix="tube_player_bench_")
+    fixture_dir = os.path.join(workdir, "fixtures")
+    make_fixtures(args.ffmpeg, fixture_dir, args.fixtures, args.seconds)
+
+    # The downloader writes to ./_music_, so keep the run inside the temp dir
+    previous_cwd = os.getcwd()
+    os.chdir(workdir)
+    server = ThreadingHTTPServer(
+        ('127.0.0.1', 0), make_handler(fixture_dir, args.bandwidth * 1024 * 1024)
+    )
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    base_url = f"http://127.0.0.1:{server.server_address[1]}"
+
+    try:
+        print(f"mode={args.mode} profile={args.profile} jobs={args.jobs} fixtures={args.fixtures}x{args.seconds}s")
+        print(f"{'workers':>7} {'jobs/min':>9} {'MB/s':>7} {'failed':>6}  per-stage p50/p95 (s)")
+        for workers in range(1, args.max_workers + 1):
+            result = run_once(args, base_url, fixture_dir, workdir, workers)
+            stages = "  ".join(
+                f"{stage}={result['stages'][stage]['wall_p50']:.2f}/{result['stages'][stage]['wall_p95']:.2f}"
+                for stage in STAGES
+                if stage in result['stages'] and result['stages'][stage]['wall_p50'] is not None
+            )
+            print(
+                f"{workers:>7} {result['jobs_per_minute']:>9.1f} {result['mb_per_second']:>7.2f} "
+                f"{result['failed']:>6}  {stages}"
+            )
+    finally:
+        server.shutdown()
+        os.chdir(previous_cwd)
+        shutil.rmtree(workdir, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    main()
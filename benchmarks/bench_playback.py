@@ -0,0 +1,155 @@
+"""Headless benchmark for queue playback on the simulated audio backend.
+
+Plays a long queue through the real AudioPlayer and QueueManager on a
+NullBackend, whose virtual clock runs as fast as the dispatcher keeps
+up, so no VLC or sound card is needed. The callbacks mirror main.py:
+the track change callback advances the queue and every callback counts
+as one UI update.
+
+    python benchmarks/bench_playback.py --tracks 10000 --track-seconds 6
+
+Reports queue-transition latency (end of a track to the track change
+callback), dispatcher cost per player event and the UI-update rate.
+"""
+import os
+import sys
+import time
+import argparse
+import threading
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from audio_player import AudioPlayer  # noqa: E402
+from player_backends import NullBackend  # noqa: E402
+from queueManager import QueueManager  # noqa: E402
+from utils import percentile  # noqa: E402
+
+
+class TimedBackend(NullBackend):
+    """NullBackend that counts events and timestamps every end-of-track."""
+
+    def __init__(self, **kwargs):
+        super().__init__(**kwargs)
+        self.events = 0
+        self.last_end = None
+
+    def new_player(self, on_event):
+        def timed(kind, value, source):
+            self.events += 1
+            if kind == 'end':
+                self.last_end = time.perf_counter()
+            on_event(kind, value, source)
+        return super().new_player(timed)
+
+
+def run(args):
+    backend = TimedBackend(default_duration=args.track_seconds)
+    audio_player = AudioPlayer(backend)
+    audio_player.preload_window = args.preload
+    audio_player.set_crossfade(0)
+
+    queue_manager = QueueManager()
+    queue_manager.add_songs([(f"track_{i}.mp3", None) for i in range(args.tracks)])
+
+    latencies = []
+    callback_time = [0.0]
+    ui_updates = [0]
+    gaps = [0]
+    finished = threading.Event()
+
+    def ui_update():
+        ui_updates[0] += 1
+        if args.ui_cost:
+            time.sleep(args.ui_cost / 1000.0)
+
+    def timed_callback(callback):
+        def wrapper(*a):
+            started = time.perf_counter()
+            callback(*a)
+            callback_time[0] += time.perf_counter() - started
+        return wrapper
+
+    def next_track_path():
+        next_song = queue_manager.peek_next_song()
+        return next_song[0] if next_song else None
+
+    def on_track_change(file_path):
+        latencies.append(time.perf_counter() - backend.last_end)
+        queue_manager.get_next_song()
+        ui_update()
+
+    def on_song_complete():
+        next_song = queue_manager.get_next_song()
+        if next_song:
+            # The next song was not preloaded in time and starts with a gap
+            gaps[0] += 1
+            audio_player.play(next_song[0], args.track_seconds)
+            ui_update()
+        else:
+            finished.set()
+
+    audio_player.set_next_track_provider(next_track_path)
+    audio_player.set_on_track_change_callback(timed_callback(on_track_change))
+    audio_player.set_on_complete_callback(timed_callback(on_song_complete))
+    audio_player.set_on_position_update_callback(timed_callback(lambda position: ui_update()))
+    audio_player.set_on_duration_callback(timed_callback(lambda duration: None))
+
+    started = time.perf_counter()
+    audio_player.play(queue_manager.get_current_song()[0], args.track_seconds)
+    while not finished.is_set():
+        backend.advance(args.step, step=args.step)
+        audio_player.drain()
+    elapsed = time.perf_counter() - started
+    audio_player.close()
+
+    simulated = backend.now
+    return {
+        'elapsed': elapsed,
+        'simulated': simulated,
+        'events': backend.events,
+        'transitions': len(latencies),
+        'gaps': gaps[0],
+        'latency_p50': percentile(latencies, 50),
+        'latency_p95': percentile(latencies, 95),
+        'latency_max': max(latencies) if latencies else None,
+        'event_cost': elapsed / backend.events if backend.events else None,
+        'callback_share': callback_time[0] / elapsed,
+        'ui_per_second': ui_updates[0] / elapsed,
+        'ui_per_simulated_second': ui_updates[0] / simulated if simulated else None,
+    }
+
+
+def _ms(value):
+    return "-" if value is None else f"{value * 1000:.3f} ms"
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--tracks', type=int, default=10000)
+    parser.add_argument('--track-seconds', type=float, default=6.0, help="simulated length of each track")
+    parser.add_argument('--step', type=float, default=0.25, help="simulated seconds between player events")
+    parser.add_argument('--preload', type=float, default=2.0, help="preload window in seconds")
+    parser.add_argument('--ui-cost', type=float, default=0.0,
+                        help="milliseconds each simulated UI update takes")
+    args = parser.parse_args()
+
+    result = run(args)
+    print(f"tracks={args.tracks} track={args.track_seconds}s step={args.step}s preload={args.preload}s")
+    print(f"session:      {result['simulated'] / 3600:.1f} h simulated in {result['elapsed']:.2f} s")
+    print(f"transitions:  {result['transitions']} gapless, {result['gaps']} with a gap")
+    print(
+        f"transition:   p50 {_ms(result['latency_p50'])}  p95 {_ms(result['latency_p95'])}"
+        f"  max {_ms(result['latency_max'])}"
+    )
+    print(
+        f"events:       {result['events']} at {_ms(result['event_cost'])} each,"
+        f" {result['callback_share'] * 100:.1f}% of the time in callbacks"
+    )
+    print(
+        f"UI updates:   {result['ui_per_second']:.0f}/s wall,"
+        f" {result['ui_per_simulated_second']:.2f}/s simulated"
+    )
+
+
+if __name__ == "__main__":
+    main()
@@ -1,97 +1,489 @@
 import sqlite3
 import os
+import re
+import queue
 import threading
+from contextlib import contextmanager
+from migrations import migrate
+from waveform import peaks_path
+from utils import MUSIC_DIR, is_inside
+
+# Seconds a writer waits for another writer's lock before failing
+BUSY_TIMEOUT = 10.0
+# Page cache per connection, in KiB (negative cache_size means KiB)
+CACHE_SIZE_KB = 8 * 1024
+# Bytes of the database file read through memory-mapped I/O
+MMAP_SIZE = 64 * 1024 * 1024
+# Prepared statements kept per connection
+STATEMENT_CACHE_SIZE = 256
+# Weights of title, original_title, uploader and tags in search ranking
+SEARCH_WEIGHTS = (10.0, 5.0, 2.0, 1.0)
+# Most ids bound in one "IN (...)" query, well under SQLite's variable limit
+MAX_QUERY_IDS = 500
+# Library sort orders: SQL sort expression (matching an index created in
+# migrations.py) and whether it sorts descending by default
+SORT_KEYS = {
+    'created_at': ('created_at', True),
+    'title': ('title COLLATE NOCASE', False),
+    'duration': ('IFNULL(duration, 0)', False),
+    'play_count': ('play_count', True),
+    'last_played': ('IFNULL(last_played, 0)', True),
+}
 
 class Database:
-    def __init__(self, db_file="songs.db"):
+    def __init__(self, db_file="songs.db", music_dir=MUSIC_DIR):
         # Ensure the database directory exists
         os.makedirs(os.path.dirname(db_file) if os.path.dirname(db_file) else '.', exist_ok=True)
 
         # Use threading.local() to handle per-thread connection
         self.local_storage = threading.local()
         self.db_file = db_file
+        # Only files below this folder are ever deleted along with a song
+        self.music_dir = music_dir
+        # Every connection handed out, so close() can reach other threads' ones
+        self._connections = []
+        self._connections_lock = threading.Lock()
+        # Files of deleted songs, removed by a background thread
+        self._unlink_queue = queue.Queue()
+        self._unlink_thread = None
+        self._unlink_lock = threading.Lock()
+
+        # Bring the schema up to date once, before any thread uses it
+        conn = self.get_connection()
+        migrate(conn)
+        # False when SQLite lacks FTS5 and search falls back to LIKE
+        self.fts_enabled = conn.execute(
+            "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'songs_fts'"
+        ).fetchone() is not None
 
     def get_connection(self):
-        if not hasattr(self.local_storage, 'conn'):
+        conn = getattr(self.local_storage, 'conn', None)
+        if conn is None:
             # Create a new SQLite connection for the current thread
-            self.local_storage.conn = sqlite3.connect(self.db_file, check_same_thread=False)
-            self.create_tables(self.local_storage.conn)
-        return self.local_storage.conn
+            conn = sqlite3.connect(
+                self.db_file,
+                check_same_thread=False,
+                timeout=BUSY_TIMEOUT,
+                cached_statements=STATEMENT_CACHE_SIZE,
+            )
+            self.configure_connection(conn)
+            self.local_storage.conn = conn
+            with self._connections_lock:
+                self._connections.append(conn)
+        return conn
 
-    def create_tables(self, conn):
-        cursor = conn.cursor()
-        cursor.execute('''
-        CREATE TABLE IF NOT EXISTS songs (
-            id INTEGER PRIMARY KEY AUTOINCREMENT,
-            title TEXT NOT NULL,
-            file_path TEXT UNIQUE NOT NULL,
-            thumbnail TEXT,
-            duration INTEGER,
-            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
-        )
-        ''')
-        conn.commit()
+    def configure_connection(self, conn):
+        """Apply the pragmas every connection uses.
 
-    def add_song(self, title, file_path, thumbnail, duration):
+        WAL lets the UI and share threads read while a download commits a
+        song, and synchronous=NORMAL only syncs at checkpoints, which is
+        safe in WAL mode and makes each commit much cheaper.
+        """
+        conn.execute('PRAGMA journal_mode=WAL')
+        conn.execute('PRAGMA synchronous=NORMAL')
+        conn.execute(f'PRAGMA cache_size=-{CACHE_SIZE_KB}')
+        conn.execute(f'PRAGMA mmap_size={MMAP_SIZE}')
+        conn.execute('PRAGMA temp_store=MEMORY')
+
+    @contextmanager
+    def transaction(self):
+        """Run several statements in one transaction on this thread's connection."""
+        conn = self.get_connection()
+        with conn:
+            yield conn
+
+    def close(self):
+        """Finish pending file removals and close the connections of every thread."""
+        with self._unlink_lock:
+            unlink_thread, self._unlink_thread = self._unlink_thread, None
+        if unlink_thread is not None:
+            self._unlink_queue.put(None)
+            unlink_thread.join(timeout=5)
+        with self._connections_lock:
+            connections = self._connections
+            self._connections = []
+        # Threads that use the database again get a fresh connection
+        self.local_storage = threading.local()
+        for index, conn in enumerate(connections):
+            try:
+                if index == 0:
+                    # Refresh query planner statistics once per session
+                    conn.execute('PRAGMA optimize')
+                conn.close()
+            except sqlite3.Error as e:
+                print(f"Error closing database connection: {e}")
+
+    def add_song(self, title, file_path, thumbnail, duration, profile=None, video_id=None,
+                 original_title=None, uploader=None, tags=None, file_size=None, codec=None,
+                 bitrate=None):
         conn = self.get_connection()
         cursor = conn.cursor()
-        
-        # Check if file_path already exists
-        cursor.execute("SELECT COUNT(*) FROM songs WHERE file_path = ?", (file_path,))
-        exists = cursor.fetchone()[0] > 0
-        
-        if exists:
-            # If exists, modify the file_path to make it unique
-            base_path = os.path.splitext(file_path)
-            counter = 1
-            while exists:
-                new_file_path = f"{base_path[0]}_{counter}{base_path[1]}"
-                cursor.execute("SELECT COUNT(*) FROM songs WHERE file_path = ?", (new_file_path,))
-                exists = cursor.fetchone()[0] > 0
-                counter += 1
-            file_path = new_file_path
-        
+        file_path = self.unique_file_path(file_path)
+
         # Now insert with unique file_path
         cursor.execute('''
-        INSERT INTO songs (title, file_path, thumbnail, duration)
-        VALUES (?, ?, ?, ?)
-        ''', (title, file_path, thumbnail, duration))
+        INSERT INTO songs (title, file_path, thumbnail, duration, profile, video_id,
+                           original_title, uploader, tags, file_size, codec, bitrate)
+        VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+        ''', (title, file_path, thumbnail, duration, profile, video_id,
+              original_title, uploader, tags, file_size, codec, bitrate))
         
         conn.commit()
         return cursor.lastrowid
 
+    def unique_file_path(self, file_path):
+        """Return file_path, or the first free "name_N.ext" if it is taken.
+
+        The path and all of its numbered variants are fetched in one query,
+        an equality lookup plus a range scan over "name_" on the file_path
+        index, instead of one lookup per candidate suffix.
+        """
+        base, ext = os.path.splitext(file_path)
+        prefix = base + '_'
+        # '`' sorts right after '_', so the range is every path starting with prefix
+        cursor = self.get_connection().execute('''
+        SELECT file_path FROM songs WHERE file_path = ?
+        UNION ALL
+        SELECT file_path FROM songs WHERE file_path > ? AND file_path < ?
+        ''', (file_path, prefix, base + '`'))
+        taken = {row[0] for row in cursor}
+        if file_path not in taken:
+            return file_path
+        counter = 1
+        while f"{prefix}{counter}{ext}" in taken:
+            counter += 1
+        return f"{prefix}{counter}{ext}"
+
+    def add_songs(self, songs):
+        """Insert many songs in one transaction; return how many were new.
+
+        songs are dicts with add_song's keyword names. Paths already in
+        the library are skipped.
+        """
+        with self.transaction() as conn:
+            cursor = conn.executemany('''
+            INSERT OR IGNORE INTO songs (title, file_path, thumbnail, duration,
+                                         original_title, uploader, tags, file_size, codec, bitrate)
+            VALUES (:title, :file_path, :thumbnail, :duration,
+                    :original_title, :uploader, :tags, :file_size, :codec, :bitrate)
+            ''', songs)
+            return cursor.rowcount
+
+    def get_song_file_paths(self):
+        """Return the set of every file path in the library."""
+        conn = self.get_connection()
+        return {row[0] for row in conn.execute('SELECT file_path FROM songs')}
+
     def get_song_by_path(self, file_path):
         conn = self.get_connection()
         cursor = conn.cursor()
         cursor.execute('SELECT * FROM songs WHERE file_path = ?', (file_path,))
         return cursor.fetchone()
 
-    def get_all_songs(self):
+    def get_song_by_video_id(self, video_id):
+        conn = self.get_connection()
+        cursor = conn.cursor()
+        cursor.execute('SELECT * FROM songs WHERE video_id = ?', (video_id,))
+        return cursor.fetchone()
+
+    def get_songs_page(self, sort='created_at', after=None, limit=50, descending=None):
+        """Return one page of the library and the cursor for the next page.
+
+        sort is a key of SORT_KEYS. after is the cursor returned with the
+        previous page (None for the first page); the next cursor is None
+        once the last page has been returned. Each page is an index range
+        scan starting at the cursor, so its cost doesn't grow with the
+        library or with how far the user has scrolled.
+        """
+        expression, default_descending = SORT_KEYS[sort]
+        if descending is None:
+            descending = default_descending
+        direction, op = ('DESC', '<') if descending else ('ASC', '>')
+
+        where = ''
+        params = []
+        if after is not None:
+            value, song_id = after
+            # Equivalent to (expression, id) > (value, song_id), written so
+            # SQLite can start the index scan at value
+            where = f'WHERE {expression} {op}= ? AND ({expression} {op} ? OR id {op} ?)'
+            params = [value, value, song_id]
+
         conn = self.get_connection()
         cursor = conn.cursor()
-        cursor.execute('SELECT * FROM songs ORDER BY created_at DESC')
+        cursor.execute(f'''
+        SELECT *, {expression} FROM songs {where}
+        ORDER BY {expression} {direction}, id {direction}
+        LIMIT ?
+        ''', (*params, limit))
+        rows = cursor.fetchall()
+        next_cursor = (rows[-1][-1], rows[-1][0]) if len(rows) == limit else None
+        return [row[:-1] for row in rows], next_cursor
+
+    def search_songs(self, query, limit=50):
+        """Return up to limit songs matching every word of query, best first.
+
+        Each word matches as a prefix, so "beat it" finds "Beatles - Let
+        It Be". Ranked by BM25 with title matches weighted highest.
+        """
+        words = re.findall(r'\w+', query or '')
+        if not words:
+            return []
+        conn = self.get_connection()
+        cursor = conn.cursor()
+        if not self.fts_enabled:
+            where = ' AND '.join(
+                "(title LIKE ? OR original_title LIKE ? OR uploader LIKE ? OR tags LIKE ?)"
+                for _ in words
+            )
+            params = [f"%{word}%" for word in words for _ in range(4)]
+            cursor.execute(
+                f'SELECT * FROM songs WHERE {where} ORDER BY created_at DESC LIMIT ?',
+                (*params, limit)
+            )
+            return cursor.fetchall()
+
+        match = ' '.join(f'"{word}"*' for word in words)
+        weights = ', '.join(str(weight) for weight in SEARCH_WEIGHTS)
+        cursor.execute(f'''
+        SELECT songs.* FROM songs_fts
+        JOIN songs ON songs.id = songs_fts.rowid
+        WHERE songs_fts MATCH ?
+        ORDER BY bm25(songs_fts, {weights})
+        LIMIT ?
+        ''', (match, limit))
         return cursor.fetchall()
 
+    def get_song_paths(self, after_id=0, limit=100):
+        """Return up to limit (id, file_path) rows with id > after_id, by id."""
+        conn = self.get_connection()
+        cursor = conn.cursor()
+        cursor.execute(
+            'SELECT id, file_path FROM songs WHERE id > ? ORDER BY id LIMIT ?',
+            (after_id, limit)
+        )
+        return cursor.fetchall()
+
+    def get_song_files(self, after_id=0, limit=500):
+        """Return up to limit (id, file_path, thumbnail, missing) rows with id > after_id."""
+        conn = self.get_connection()
+        cursor = conn.cursor()
+        cursor.execute(
+            'SELECT id, file_path, thumbnail, missing FROM songs WHERE id > ? ORDER BY id LIMIT ?',
+            (after_id, limit)
+        )
+        return cursor.fetchall()
+
+    def set_songs_missing(self, song_ids, missing=True):
+        """Flag (or unflag) songs whose file is no longer on disk."""
+        with self.transaction() as conn:
+            conn.executemany(
+                'UPDATE songs SET missing = ? WHERE id = ?',
+                [(int(missing), song_id) for song_id in song_ids]
+            )
+
+    def relocate_songs(self, moves):
+        """Point songs at the new location of their files and unflag them.
+
+        moves are (song_id, file_path, thumbnail) tuples. A song whose new
+        path already belongs to another song is left unchanged.
+        """
+        with self.transaction() as conn:
+            conn.executemany(
+                'UPDATE OR IGNORE songs SET file_path = ?, thumbnail = ?, missing = 0 WHERE id = ?',
+                [(file_path, thumbnail, song_id) for song_id, file_path, thumbnail in moves]
+            )
+
+    def add_plays(self, plays, counts, last_played):
+        """Record a batch of plays and update the songs' aggregates, atomically.
+
+        plays are (song_id, started_at, ended_at, seconds, skipped) tuples;
+        counts maps song id to plays to add to play_count, and last_played
+        maps song id to its latest play time.
+        """
+        with self.transaction() as conn:
+            conn.executemany('''
+            INSERT INTO plays (song_id, started_at, ended_at, seconds, skipped)
+            VALUES (?, ?, ?, ?, ?)
+            ''', plays)
+            conn.executemany('''
+            UPDATE songs SET play_count = play_count + ?,
+                             last_played = MAX(IFNULL(last_played, 0), ?)
+            WHERE id = ?
+            ''', [
+                (counts.get(song_id, 0), played_at, song_id)
+                for song_id, played_at in last_played.items()
+            ])
+
     def delete_song(self, song_id):
+        self.delete_songs([song_id])
+
+    def delete_songs(self, song_ids):
+        """Delete songs and their plays in one transaction; return how many.
+
+        Their audio, waveform peaks and cover files are removed afterwards
+        by a background thread, so the caller doesn't wait on the disk.
+        Only files inside music_dir are removed: songs imported from the
+        user's own folders lose their library row, never their files.
+        Covers still used by another song are kept.
+        """
+        song_ids = list(song_ids)
+        if not song_ids:
+            return 0
+        files = []
+        thumbnails = set()
+        deleted = 0
+        with self.transaction() as conn:
+            for start in range(0, len(song_ids), MAX_QUERY_IDS):
+                chunk = song_ids[start:start + MAX_QUERY_IDS]
+                placeholders = ', '.join('?' * len(chunk))
+                for file_path, thumbnail in conn.execute(
+                    f'SELECT file_path, thumbnail FROM songs WHERE id IN ({placeholders})', chunk
+                ):
+                    if is_inside(file_path, self.music_dir):
+                        files.append(file_path)
+                    # Peaks always live in the music folder
+                    files.append(peaks_path(file_path, self.music_dir))
+                    if thumbnail and is_inside(thumbnail, self.music_dir):
+                        thumbnails.add(thumbnail)
+                deleted += conn.execute(
+                    f'DELETE FROM songs WHERE id IN ({placeholders})', chunk
+                ).rowcount
+                conn.execute(f'DELETE FROM plays WHERE song_id IN ({placeholders})', chunk)
+
+            # Imported songs from one album share a cover file
+            covers = list(thumbnails)
+            for start in range(0, len(covers), MAX_QUERY_IDS):
+                chunk = covers[start:start + MAX_QUERY_IDS]
+                placeholders = ', '.join('?' * len(chunk))
+                for (thumbnail,) in conn.execute(
+                    f'SELECT DISTINCT thumbnail FROM songs WHERE thumbnail IN ({placeholders})', chunk
+                ):
+                    thumbnails.discard(thumbnail)
+
+        files.extend(thumbnails)
+        self._unlink_later(files)
+        return deleted
+
+    def _unlink_later(self, paths):
+        for path in paths:
+            self._unlink_queue.put(path)
+        with self._unlink_lock:
+            if self._unlink_thread is None:
+                self._unlink_thread = threading.Thread(
+                    target=self._unlink_worker, daemon=True, name="db-unlink"
+                )
+                self._unlink_thread.start()
+
+    def _unlink_worker(self):
+        while True:
+            path = self._unlink_queue.get()
+            if path is None:
+                return
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                pass
+            except OSError as e:
+                print(f"Error removing {path}: {e}")
+
+    def get_cached_video_info(self, video_id):
+        """Return (info_json, fetched_at) for a cached video, or None."""
         conn = self.get_connection()
         cursor = conn.cursor()
-        # First get the file path to delete the actual file
-        cursor.execute('SELECT file_path, thumbnail FROM songs WHERE id = ?', (song_id,))
-        result = cursor.fetchone()
-       
-        if result:
-            file_path = result[0]
-            thumbnail = result[1]
-            if os.path.exists(file_path):
-                try:
-                    os.remove(file_path)
-                    os.remove(thumbnail)
-                except OSError:
-                    pass  # Handle file deletion error gracefully
-                    
-        cursor.execute('DELETE FROM songs WHERE id = ?', (song_id,))
+        cursor.execute(
+            'SELECT info, fetched_at FROM video_info_cache WHERE video_id = ?',
+            (video_id,)
+        )
+        return cursor.fetchone()
+
+    def touch_cached_video_info(self, video_id, accessed_at):
+        conn = self.get_connection()
+        conn.execute(
+            'UPDATE video_info_cache SET accessed_at = ? WHERE video_id = ?',
+            (accessed_at, video_id)
+        )
         conn.commit()
 
+    def save_cached_video_info(self, video_id, info_json, fetched_at):
+        conn = self.get_connection()
+        conn.execute('''
+        INSERT OR REPLACE INTO video_info_cache (video_id, info, fetched_at, accessed_at)
+        VALUES (?, ?, ?, ?)
+        ''', (video_id, info_json, fetched_at, fetched_at))
+        conn.commit()
+
+    def delete_cached_video_info(self, video_id):
+        conn = self.get_connection()
+        conn.execute('DELETE FROM video_info_cache WHERE video_id = ?', (video_id,))
+        conn.commit()
+
+    def prune_video_info_cache(self, max_rows, expired_before):
+        """Drop expired entries, then the least recently used beyond max_rows."""
+        conn = self.get_connection()
+        conn.execute('DELETE FROM video_info_cache WHERE fetched_at < ?', (expired_before,))
+        conn.execute('''
+        DELETE FROM video_info_cache WHERE video_id IN (
+            SELECT video_id FROM video_info_cache
+            ORDER BY accessed_at DESC LIMIT -1 OFFSET ?
+        )
+        ''', (max_rows,))
+        conn.commit()
+
+    def save_journal_entry(self, video_id, url, part_path, bytes_done, total_bytes, updated_at):
+        conn = self.get_connection()
+        conn.execute('''
+        INSERT OR REPLACE INTO download_journal
+            (video_id, url, part_path, bytes_done, total_bytes, updated_at)
+        VALUES (?, ?, ?, ?, ?, ?)
+        ''', (video_id, url, part_path, bytes_done, total_bytes, updated_at))
+        conn.commit()
+
+    def get_journal_entry(self, video_id):
+        conn = self.get_connection()
+        cursor = conn.cursor()
+        cursor.execute('SELECT * FROM download_journal WHERE video_id = ?', (video_id,))
+        return cursor.fetchone()
+
+    def get_journal_entries(self):
+        conn = self.get_connection()
+        cursor = conn.cursor()
+        cursor.execute('SELECT * FROM download_journal')
+        return cursor.fetchall()
+
+    def delete_journal_entry(self, video_id):
+        conn = self.get_connection()
+        conn.execute('DELETE FROM download_journal WHERE video_id = ?', (video_id,))
+        conn.commit()
+
+    def add_download_stat(self, job_key, stage, started_at, wall_time, cpu_time, byte_count, error=None):
+        conn = self.get_connection()
+        conn.execute('''
+        INSERT INTO download_stats (job_key, stage, started_at, wall_time, cpu_time, bytes, error)
+        VALUES (?, ?, ?, ?, ?, ?, ?)
+        ''', (job_key, stage, started_at, wall_time, cpu_time, byte_count, error))
+        conn.commit()
+
+    def prune_download_stats(self, stage, max_rows):
+        """Keep only the newest max_rows runs of a stage."""
+        conn = self.get_connection()
+        conn.execute('''
+        DELETE FROM download_stats WHERE stage = ? AND started_at < (
+            SELECT started_at FROM download_stats WHERE stage = ?
+            ORDER BY started_at DESC LIMIT 1 OFFSET ?
+        )
+        ''', (stage, stage, max_rows - 1))
+        conn.commit()
+
+    def get_download_stats(self, stage, limit=500):
+        """Return (wall_time, cpu_time, bytes, error) for the latest runs of a stage."""
+        conn = self.get_connection()
+        cursor = conn.cursor()
+        cursor.execute('''
+        SELECT wall_time, cpu_time, bytes, error FROM download_stats
+        WHERE stage = ? ORDER BY started_at DESC LIMIT ?
+        ''', (stage, limit))
+        return cursor.fetchall()
+
     def __del__(self):
-        if hasattr(self.local_storage, 'conn'):
-            self.local_storage.conn.close()
+        self.close()
@@ -0,0 +1,108 @@
+import flet as ft
+from async_database import on_result
+from library_reconciler import ORPHAN_DIR
+from pipeline_stats import STAGES
+
+
+def _seconds(value):
+    return "-" if value is None else f"{value:.2f}s"
+
+
+def _rate(value):
+    return "-" if value is None else f"{value / (1024 * 1024):.2f} MB/s"
+
+
+def create_diagnostics_sheet(stats, async_db, page, on_close):
+    """Bottom sheet with p50/p95 timings for each download stage.
+
+    The timings are read on the database thread of async_db.
+    """
+    stats_table = ft.DataTable(
+        columns=[
+            ft.DataColumn(ft.Text("Stage")),
+            ft.DataColumn(ft.Text("Runs"), numeric=True),
+            ft.DataColumn(ft.Text("Errors"), numeric=True),
+            ft.DataColumn(ft.Text("Wall p50 / p95")),
+            ft.DataColumn(ft.Text("CPU p50 / p95")),
+            ft.DataColumn(ft.Text("Throughput p50 / p95")),
+        ],
+        rows=[],
+    )
+    bottleneck_text = ft.Text("", size=16, color=ft.colors.GREEN)
+    library_check_text = ft.Text("Library not checked yet", size=14)
+
+    def show_library_check(result):
+        """Show the outcome of a LibraryReconciler pass."""
+        library_check_text.value = (
+            f"Library check: {result.songs} songs, {result.missing} newly missing, "
+            f"{result.restored} found again, {result.relocated} relocated, "
+            f"{result.orphans} unused files moved to {ORPHAN_DIR} "
+            f"({result.bytes_moved / (1024 * 1024):.1f} MB)"
+        )
+
+    def refresh():
+        """Load the stage summary in the background and show it when ready."""
+        bottleneck_text.value = "Loading download timings..."
+        page.update()
+        on_result(async_db.submit(stats.summary), show_summary)
+
+    def show_summary(summary):
+        stats_table.rows.clear()
+        for stage in STAGES:
+            if stage not in summary:
+                continue
+            row = summary[stage]
+            stats_table.rows.append(
+                ft.DataRow(
+                    cells=[
+                        ft.DataCell(ft.Text(stage)),
+                        ft.DataCell(ft.Text(str(row["count"]))),
+                        ft.DataCell(ft.Text(str(row["errors"]))),
+                        ft.DataCell(ft.Text(f"{_seconds(row['wall_p50'])} / {_seconds(row['wall_p95'])}")),
+                        ft.DataCell(ft.Text(f"{_seconds(row['cpu_p50'])} / {_seconds(row['cpu_p95'])}")),
+                        ft.DataCell(ft.Text(f"{_rate(row['throughput_p50'])} / {_rate(row['throughput_p95'])}")),
+                    ]
+                )
+            )
+        if summary:
+            bottleneck_text.value = f"Recent downloads look {stats.bottleneck(summary)}"
+        else:
+            bottleneck_text.value = "No downloads recorded yet"
+        page.update()
+
+    bottom_sheet = ft.BottomSheet(
+        content=ft.Container(
+            expand=True,
+            padding=20,
+            bgcolor='#17202a',
+            content=ft.Column(
+                [
+                    ft.Row(
+                        controls=[
+                            ft.Text("Download Diagnostics", size=20, weight=ft.FontWeight.BOLD),
+                            ft.Row(
+                                controls=[
+                                    ft.IconButton(
+                                        icon=ft.icons.REFRESH,
+                                        tooltip="Refresh",
+                                        on_click=lambda e: refresh(),
+                                    ),
+                                    ft.IconButton(icon=ft.icons.CLOSE, on_click=on_close),
+                                ]
+                            ),
+                        ],
+                        alignment=ft.MainAxisAlignment.SPACE_BETWEEN,
+                    ),
+                    bottleneck_text,
+                    library_check_text,
+                    ft.ListView(controls=[stats_table], expand=True),
+                ],
+                tight=True,
+                horizontal_alignment=ft.CrossAxisAlignment.STRETCH,
+            ),
+        ),
+    )
+
+    bottom_sheet.refresh = refresh
+    bottom_sheet.show_library_check = show_library_check
+    return bottom_sheet
@@ -0,0 +1,99 @@
+import os
+import time
+import threading
+
+# Progress is written to the journal at most this often per download
+JOURNAL_WRITE_INTERVAL = 2.0
+
+
+class DownloadJournal:
+    """Tracks partial downloads so they can resume after a cancel or restart.
+
+    Sources are downloaded to a stable per-video path in the partial
+    folder. yt-dlp keeps the unfinished bytes in '<path>.part' and continues
+    from that offset with range requests, and the journal records how far
+    each download got.
+    """
+
+    def __init__(self, db, partial_dir):
+        self.db = db
+        self.partial_dir = partial_dir
+        os.makedirs(self.partial_dir, exist_ok=True)
+        self._last_write = {}
+        self._lock = threading.Lock()
+
+    def partial_path(self, video_id, ext='webm'):
+        """Stable download path for a video, shared by every attempt."""
+        return os.path.join(self.partial_dir, f"{video_id}.{ext}")
+
+    def get(self, video_id):
+        try:
+            return self.db.get_journal_entry(video_id)
+        except Exception as e:
+            print(f"Error reading download journal: {e}")
+            return None
+
+    def record(self, video_id, url, part_path, bytes_done, total_bytes, force=False):
+        """Store progress for a download, throttled to JOURNAL_WRITE_INTERVAL."""
+        now = time.time()
+        with self._lock:
+            if not force and now - self._last_write.get(video_id, 0) < JOURNAL_WRITE_INTERVAL:
+                return
+            self._last_write[video_id] = now
+        try:
+            self.db.save_journal_entry(video_id, url, part_path, bytes_done, total_bytes, now)
+        except Exception as e:
+            print(f"Error writing download journal: {e}")
+
+    def finish(self, part_path):
+        """Forget the journal entry for a source file that is no longer needed."""
+        video_id = os.path.splitext(os.path.basename(part_path))[0]
+        with self._lock:
+            self._last_write.pop(video_id, None)
+        try:
+            self.db.delete_journal_entry(video_id)
+        except Exception as e:
+            print(f"Error updating download journal: {e}")
+
+    def cleanup_orphans(self, max_age_days=7):
+        """Remove partial files and journal entries that can no longer resume.
+
+        Deletes files in the partial folder that the journal does not know,
+        entries whose files are gone, and entries older than max_age_days.
+        Returns the number of bytes freed.
+        """
+        freed = 0
+        now = time.time()
+        known = set()
+        try:
+            entries = self.db.get_journal_entries()
+        except Exception as e:
+            print(f"Error reading download journal: {e}")
+            return 0
+
+        for video_id, _, part_path, _, _, updated_at in entries:
+            paths = [part_path, part_path + '.part']
+            exists = any(os.path.exists(path) for path in paths)
+            if not exists or now - updated_at > max_age_days * 86400:
+                for path in paths:
+                    freed += self._remove(path)
+                self.db.delete_journal_entry(video_id)
+            else:
+                known.update(os.path.normcase(os.path.abspath(path)) for path in paths)
+
+        with os.scandir(self.partial_dir) as it:
+            for entry in it:
+                if entry.is_file() and os.path.normcase(os.path.abspath(entry.path)) not in known:
+                    freed += self._remove(entry.path)
+
+        if freed:
+            print(f"Removed orphaned partial downloads: {freed / (1024 * 1024):.1f} MB")
+        return freed
+
+    def _remove(self, path):
+        try:
+            size = os.path.getsize(path)
+            os.remove(path)
+            return size
+        except OSError:
+            return 0
@@ -0,0 +1,367 @@
+import os
+import threading
+import itertools
+from concurrent.futures import ThreadPoolExecutor
+from metadata_cache import video_id_from_url
+from pipeline_stats import STAGE_LIBRARY
+from progress_aggregator import ProgressAggregator
+
+
+class DownloadJob:
+    """A single queued download with its own cancel token and progress."""
+
+    QUEUED = "queued"
+    DOWNLOADING = "downloading"
+    CONVERTING = "converting"
+    DONE = "done"
+    FAILED = "failed"
+    CANCELLED = "cancelled"
+
+    def __init__(self, job_id, url, title=None, info=None):
+        self.id = job_id
+        self.url = url
+        self.title = title
+        self.info = info
+        self.video_id = (info or {}).get("id") or video_id_from_url(url)
+        # True when the video was already in the library and nothing was downloaded
+        self.duplicate = False
+        self.status = self.QUEUED
+        self.progress = 0.0
+        # Smoothed by the ProgressAggregator on every tick
+        self.speed = 0.0
+        self.eta = None
+        self.file_path = None
+        self.thumbnail = None
+        self.song_id = None
+        self.error = None
+        self.profile = None
+        self.cancel_event = threading.Event()
+        self.future = None
+        self.transcode_future = None
+
+    def cancel(self):
+        """Ask the worker running this job to stop."""
+        self.cancel_event.set()
+        # A conversion that has not started yet can simply be dropped
+        if self.transcode_future is not None:
+            self.transcode_future.cancel()
+
+    @property
+    def is_active(self):
+        return self.status in (self.QUEUED, self.DOWNLOADING, self.CONVERTING)
+
+
+class DownloadManager:
+    """Runs YouTubeDownloader.download jobs on a bounded worker pool.
+
+    With a Transcoder, downloads that cannot be streamed hand their source
+    file to the transcoding queue and free the worker for the next link.
+    """
+
+    def __init__(self, downloader, db, max_workers=3, on_job_update=None, profile=None,
+                 transcoder=None, on_progress=None, progress_rate=5.0):
+        self.downloader = downloader
+        self.db = db
+        self.profile = profile
+        self.transcoder = transcoder
+        self.max_workers = max(1, int(max_workers))
+        # on_job_update fires on status changes; byte progress is coalesced
+        # and delivered to on_progress at most progress_rate times a second
+        self.on_job_update = on_job_update
+        self.on_progress = on_progress
+        self._progress = ProgressAggregator(self._on_progress_tick, rate=progress_rate)
+        self.jobs = []
+        # Video id -> job currently downloading it
+        self._in_flight = {}
+        self._ids = itertools.count(1)
+        self._lock = threading.Lock()
+        # Set by shutdown(), whose cancels must not discard finished sources
+        self._closing = False
+        self._executor = ThreadPoolExecutor(
+            max_workers=self.max_workers, thread_name_prefix="download"
+        )
+
+    def find_existing_song(self, video_id):
+        """Return the library row for a video id, or None.
+
+        Rows whose audio file has gone missing are removed so the video can
+        be downloaded again.
+        """
+        if not video_id:
+            return None
+        song = self.db.get_song_by_video_id(video_id)
+        if song and not os.path.exists(song[2]):
+            self.db.delete_song(song[0])
+            return None
+        return song
+
+    def submit(self, url, title=None, info=None):
+        """Queue a URL for download and return its DownloadJob.
+
+        If the same video is already downloading, that job is returned
+        instead of starting a second one.
+        """
+        job = DownloadJob(next(self._ids), url, title=title, info=info)
+        with self._lock:
+            running = self._in_flight.get(job.video_id) if job.video_id else None
+            if running is not None:
+                return running
+            if job.video_id:
+                self._in_flight[job.video_id] = job
+            self.jobs.append(job)
+        job.future = self._executor.submit(self._run_job, job)
+        self._notify(job)
+        return job
+
+    def cancel(self, job_id):
+        """Cancel one job by id."""
+        for job in self.get_jobs():
+            if job.id == job_id:
+                job.cancel()
+                return True
+        return False
+
+    def cancel_all(self):
+        """Cancel every queued or running job."""
+        for job in self.active_jobs():
+            job.cancel()
+
+    def get_jobs(self):
+        with self._lock:
+            return list(self.jobs)
+
+    def active_jobs(self):
+        return [job for job in self.get_jobs() if job.is_active]
+
+    def clear_finished(self):
+        """Forget jobs that are no longer queued or running."""
+        with self._lock:
+            self.jobs = [job for job in self.jobs if job.is_active]
+
+    def overall_progress(self):
+        """Average progress (0-100) of the active jobs."""
+        active = self.active_jobs()
+        if not active:
+            return 0.0
+        return sum(job.progress for job in active) / len(active)
+
+    def resume_conversions(self):
+        """Queue again the journaled downloads whose source finished but was never converted.
+
+        Their source is still on disk, so the job skips straight to the
+        transcoding queue. Returns the number of jobs queued.
+        """
+        journal = self.downloader.journal
+        if not journal or not self.transcoder:
+            return 0
+        try:
+            entries = self.db.get_journal_entries()
+        except Exception as e:
+            print(f"Error reading download journal: {e}")
+            return 0
+        resumed = 0
+        for video_id, url, part_path, _, _, _ in entries:
+            if os.path.exists(part_path) and not os.path.exists(part_path + '.part'):
+                self.submit(url)
+                resumed += 1
+        if resumed:
+            print(f"Resuming {resumed} unfinished conversions")
+        return resumed
+
+    def shutdown(self, wait=False):
+        self._closing = True
+        self.cancel_all()
+        self._executor.shutdown(wait=wait, cancel_futures=True)
+        self._progress.stop()
+        if self.transcoder:
+            self.transcoder.shutdown(wait=wait)
+
+    def _claim(self, job, video_id):
+        """Register job as the download of video_id; False if another job has it."""
+        with self._lock:
+            running = self._in_flight.get(video_id)
+            if running is not None and running is not job:
+                return False
+            if job.video_id and self._in_flight.get(job.video_id) is job:
+                del self._in_flight[job.video_id]
+            self._in_flight[video_id] = job
+            job.video_id = video_id
+            return True
+
+    def _mark_duplicate(self, job, song):
+        job.duplicate = True
+        job.song_id = song[0]
+        job.title = song[1]
+        job.file_path = song[2]
+        job.thumbnail = song[3]
+        job.progress = 100.0
+        job.status = DownloadJob.DONE
+
+    def _on_progress_tick(self, snapshots):
+        jobs = {job.id: job for job in self.get_jobs()}
+        for job_id, snapshot in snapshots.items():
+            job = jobs.get(job_id)
+            if job is None:
+                continue
+            if snapshot.percent is not None:
+                job.progress = snapshot.percent
+            job.speed = snapshot.speed
+            job.eta = snapshot.eta
+        if self.on_progress:
+            self.on_progress(self.active_jobs())
+
+    def _notify(self, job):
+        if job.status != DownloadJob.DOWNLOADING:
+            self._progress.remove(job.id)
+        if not job.is_active and job.video_id:
+            with self._lock:
+                if self._in_flight.get(job.video_id) is job:
+                    del self._in_flight[job.video_id]
+        if self.on_job_update:
+            try:
+                self.on_job_update(job)
+            except Exception as e:
+                print(f"Error in download job callback: {e}")
+
+    def _run_job(self, job):
+        with self.downloader.bind_job(job.video_id or job.url):
+            return self._run_job_stages(job)
+
+    def _run_job_stages(self, job):
+        if job.cancel_event.is_set():
+            job.status = DownloadJob.CANCELLED
+            self._notify(job)
+            return job
+
+        job.status = DownloadJob.DOWNLOADING
+        self._notify(job)
+
+        def progress_callback(progress, downloaded=None, total=None):
+            if downloaded is None:
+                job.progress = progress
+                self._notify(job)
+            else:
+                self._progress.update(job.id, downloaded, total)
+
+        try:
+            # Pre-flight: a known video costs no network work at all
+            existing = self.find_existing_song(job.video_id)
+            if existing:
+                self._mark_duplicate(job, existing)
+                self._notify(job)
+                return job
+
+            if job.info is None:
+                job.info = self.downloader.get_video_info(job.url)
+            video_id = job.info.get("id")
+            if video_id and video_id != job.video_id:
+                # The URL did not reveal the id; check again now that we know it
+                existing = self.find_existing_song(video_id)
+                if existing:
+                    self._mark_duplicate(job, existing)
+                    self._notify(job)
+                    return job
+                if not self._claim(job, video_id):
+                    raise Exception("This video is already being downloaded")
+            if job.title is None:
+                job.title = job.info["original_title"]
+            job.profile = self.downloader.resolve_profile(
+                self.profile, job.info.get("acodec")
+            )
+
+            if self.transcoder and not self.downloader.should_stream(job.info):
+                self._queue_conversion(job, progress_callback)
+                return job
+
+            file_path, thumbnail = self.downloader.download(
+                job.url,
+                progress_callback,
+                cancel_event=job.cancel_event,
+                info=job.info,
+                profile=job.profile,
+            )
+            self._finish(job, file_path, thumbnail)
+        except Exception as e:
+            self._fail(job, e)
+        self._notify(job)
+        return job
+
+    def _queue_conversion(self, job, progress_callback):
+        source_file = self.downloader.fetch_source(
+            job.url,
+            progress_callback,
+            cancel_event=job.cancel_event,
+            info=job.info,
+            profile=job.profile,
+        )
+        thumbnail = self.downloader.download_thumbnail(
+            job.info["thumbnail"], job.info["title"]
+        )
+
+        job.status = DownloadJob.CONVERTING
+        job.progress = 100.0
+        job.transcode_future = self.transcoder.submit(
+            source_file,
+            job.profile,
+            job.info.get("acodec"),
+            title=self.downloader.source_title(source_file, job.info),
+            job_key=job.video_id or job.url,
+            cancel_event=job.cancel_event,
+        )
+        self._notify(job)
+
+        def on_converted(future):
+            try:
+                if future.cancelled() or (job.cancel_event.is_set() and not self._closing):
+                    if not self._closing:
+                        # Cancelled by the user; on shutdown the source and
+                        # its journal entry are kept for resume_conversions()
+                        if not future.cancelled() and future.exception() is None:
+                            # FFmpeg finished before it could be stopped
+                            self._remove_output(future.result())
+                        self.downloader.remove_source(source_file)
+                    raise Exception("Download cancelled by user")
+                self._finish(job, future.result(), thumbnail)
+            except Exception as e:
+                self._fail(job, e)
+            self._notify(job)
+
+        job.transcode_future.add_done_callback(on_converted)
+
+    def _finish(self, job, file_path, thumbnail):
+        if not os.path.exists(file_path):
+            raise Exception(f"File not found: {file_path}")
+
+        job.file_path = file_path
+        job.thumbnail = thumbnail
+        codec, bitrate = self.downloader.audio_format(
+            job.profile, job.info.get("acodec"), job.info.get("abr")
+        )
+        with self.downloader.stage_timer(STAGE_LIBRARY, job.video_id or job.url):
+            job.song_id = self.db.add_song(
+                job.title, file_path, thumbnail, job.info["duration"],
+                profile=job.profile,
+                video_id=job.info.get("id"),
+                original_title=job.info.get("original_title"),
+                uploader=job.info.get("uploader"),
+                tags=job.info.get("tags"),
+                file_size=os.path.getsize(file_path),
+                codec=codec,
+                bitrate=bitrate,
+            )
+        job.progress = 100.0
+        job.status = DownloadJob.DONE
+
+    def _remove_output(self, file_path):
+        try:
+            if os.path.exists(file_path):
+                os.remove(file_path)
+        except OSError as e:
+            print(f"Error removing cancelled download {file_path}: {e}")
+
+    def _fail(self, job, error):
+        if job.cancel_event.is_set():
+            job.status = DownloadJob.CANCELLED
+        else:
+            job.status = DownloadJob.FAILED
+            job.error = str(error)
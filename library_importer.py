@@ -0,0 +1,225 @@
+import os
+import time
+import base64
+import hashlib
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+import mutagen
+from mutagen.flac import Picture
+
+# Files the importer picks up
+AUDIO_EXTENSIONS = {'.mp3', '.opus', '.ogg', '.m4a', '.aac', '.flac', '.wav'}
+
+# Tag keys for ID3, MP4 and Vorbis comments, tried in that order
+TAG_KEYS = {
+    'title': ('TIT2', '\xa9nam', 'title'),
+    'artist': ('TPE1', '\xa9ART', 'artist'),
+    'genre': ('TCON', '\xa9gen', 'genre'),
+}
+
+# Codec recorded for each mutagen file type
+CODECS = {
+    'MP3': 'mp3',
+    'MP4': 'aac',
+    'OggOpus': 'opus',
+    'OggVorbis': 'vorbis',
+    'FLAC': 'flac',
+    'WAVE': 'pcm',
+    'AAC': 'aac',
+}
+
+
+def scan_audio_files(root):
+    """Yield the audio files under root, walking it with os.scandir.
+
+    Hidden folders (such as the partial-download folder) are skipped.
+    """
+    pending = [root]
+    while pending:
+        folder = pending.pop()
+        try:
+            with os.scandir(folder) as entries:
+                for entry in entries:
+                    if entry.name.startswith('.'):
+                        continue
+                    try:
+                        if entry.is_dir(follow_symlinks=False):
+                            pending.append(entry.path)
+                        elif os.path.splitext(entry.name)[1].lower() in AUDIO_EXTENSIONS:
+                            yield entry.path, entry.stat().st_size
+                    except OSError:
+                        continue
+        except OSError as e:
+            print(f"Error scanning {folder}: {e}")
+
+
+def _first_tag(tags, field):
+    if not tags:
+        return None
+    for key in TAG_KEYS[field]:
+        try:
+            value = tags.get(key)
+        except (KeyError, ValueError):
+            value = None
+        if value is None:
+            continue
+        value = getattr(value, 'text', value)
+        if isinstance(value, list):
+            value = value[0] if value else None
+        if value:
+            return str(value).strip()
+    return None
+
+
+def _cover_art(audio):
+    """Return the embedded front cover as (bytes, extension), or None."""
+    tags = audio.tags
+    data = None
+    mime = ''
+    if hasattr(audio, 'pictures') and audio.pictures:  # FLAC
+        data, mime = audio.pictures[0].data, audio.pictures[0].mime
+    elif tags is not None and hasattr(tags, 'getall'):  # ID3
+        frames = tags.getall('APIC')
+        if frames:
+            data, mime = frames[0].data, frames[0].mime
+    elif tags is not None and 'covr' in tags:  # MP4
+        covers = tags['covr']
+        if covers:
+            data = bytes(covers[0])
+            mime = 'image/png' if covers[0].imageformat == covers[0].FORMAT_PNG else 'image/jpeg'
+    elif tags is not None and 'metadata_block_picture' in tags:  # Ogg
+        try:
+            picture = Picture(base64.b64decode(tags['metadata_block_picture'][0]))
+            data, mime = picture.data, picture.mime
+        except (ValueError, TypeError, mutagen.MutagenError):
+            data = None
+    if not data:
+        return None
+    return data, 'png' if 'png' in mime else 'jpg'
+
+
+class ImportProgress:
+    """Counts for an import in progress, passed to on_progress."""
+
+    __slots__ = ("scanned", "imported", "skipped", "failed", "elapsed", "done")
+
+    def __init__(self):
+        self.scanned = 0
+        self.imported = 0
+        self.skipped = 0  # already in the library
+        self.failed = 0  # unreadable files
+        self.elapsed = 0.0
+        self.done = False
+
+    @property
+    def files_per_second(self):
+        return self.scanned / self.elapsed if self.elapsed > 0 else 0.0
+
+
+class LibraryImporter:
+    """Adds existing audio files on disk to the library.
+
+    Files are found with os.scandir, their tags, duration and cover art
+    are read by a thread pool with mutagen (mostly file I/O, which
+    releases the GIL), and rows are inserted batch_size at a time with
+    executemany in one transaction. Songs keep their original paths;
+    only cover art is written, once per distinct image, to covers_dir.
+    """
+
+    def __init__(self, db, covers_dir, max_workers=8, batch_size=500, on_progress=None):
+        self.db = db
+        self.covers_dir = covers_dir
+        self.max_workers = max_workers
+        self.batch_size = batch_size
+        self.on_progress = on_progress
+        self._cover_lock = threading.Lock()
+        os.makedirs(self.covers_dir, exist_ok=True)
+
+    def import_folder(self, root, cancel_event=None):
+        """Import every audio file under root; return the final ImportProgress."""
+        progress = ImportProgress()
+        started = time.perf_counter()
+        known = self.db.get_song_file_paths()
+        batch = []
+
+        with ThreadPoolExecutor(max_workers=self.max_workers, thread_name_prefix="import") as executor:
+            for path, size in scan_audio_files(root):
+                if cancel_event is not None and cancel_event.is_set():
+                    break
+                progress.scanned += 1
+                if path in known:
+                    progress.skipped += 1
+                    continue
+                batch.append((path, size))
+                if len(batch) >= self.batch_size:
+                    self._import_batch(executor, batch, progress)
+                    batch = []
+                    progress.elapsed = time.perf_counter() - started
+                    self._report(progress)
+            if batch and not (cancel_event is not None and cancel_event.is_set()):
+                self._import_batch(executor, batch, progress)
+
+        progress.elapsed = time.perf_counter() - started
+        progress.done = True
+        self._report(progress)
+        print(
+            f"Imported {progress.imported} of {progress.scanned} files from {root} "
+            f"in {progress.elapsed:.1f}s ({progress.files_per_second:.0f} files/s)"
+        )
+        return progress
+
+    def read_file(self, path, size):
+        """Read one file's tags; return a row for Database.add_songs or None."""
+        try:
+            audio = mutagen.File(path)
+        except Exception as e:
+            print(f"Error reading tags from {path}: {e}")
+            return None
+        if audio is None:
+            return None
+
+        title = _first_tag(audio.tags, 'title')
+        artist = _first_tag(audio.tags, 'artist')
+        info = audio.info
+        bitrate = getattr(info, 'bitrate', 0)
+        cover = None
+        try:
+            cover = _cover_art(audio)
+        except Exception as e:
+            print(f"Error reading cover art from {path}: {e}")
+        return {
+            'title': title or os.path.splitext(os.path.basename(path))[0],
+            'file_path': path,
+            'thumbnail': self._save_cover(cover) if cover else None,
+            'duration': int(getattr(info, 'length', 0) or 0),
+            'original_title': f"{artist} - {title}" if artist and title else title,
+            'uploader': artist,
+            'tags': _first_tag(audio.tags, 'genre'),
+            'file_size': size,
+            'codec': CODECS.get(type(audio).__name__, os.path.splitext(path)[1][1:].lower()),
+            'bitrate': bitrate // 1000 if bitrate else None,
+        }
+
+    def _import_batch(self, executor, batch, progress):
+        rows = [row for row in executor.map(lambda item: self.read_file(*item), batch) if row]
+        progress.failed += len(batch) - len(rows)
+        if rows:
+            progress.imported += self.db.add_songs(rows)
+
+    def _save_cover(self, cover):
+        """Store cover art under its content hash so albums share one file."""
+        data, ext = cover
+        path = os.path.join(self.covers_dir, f"{hashlib.sha1(data).hexdigest()}.{ext}")
+        with self._cover_lock:
+            if not os.path.exists(path):
+                with open(path, 'wb') as f:
+                    f.write(data)
+        return path
+
+    def _report(self, progress):
+        if self.on_progress:
+            try:
+                self.on_progress(progress)
+            except Exception as e:
+                print(f"Error in import progress callback: {e}")
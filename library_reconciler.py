@@ -0,0 +1,196 @@
+import os
+import time
+
+from waveform import PEAKS_DIR, PEAKS_SUFFIX, peaks_path
+
+# Files in the music folder that a song can point at
+# (songs, sources, thumbnails and covers)
+LIBRARY_SUFFIXES = ('.mp3', '.opus', '.m4a', '.webm', '.jpg', '.png')
+# Only files the app can regenerate are ever reclaimed; audio never is
+RECLAIM_SUFFIXES = (PEAKS_SUFFIX,)
+# Folder inside the music folder that reclaimed files are moved to
+ORPHAN_DIR = "orphaned"
+# Files changed this recently may belong to a download in progress
+ORPHAN_GRACE_SECONDS = 3600
+
+
+class ReconcileResult:
+    """What one reconciler pass found and did."""
+
+    __slots__ = ("songs", "missing", "restored", "relocated", "orphans", "bytes_moved", "elapsed")
+
+    def __init__(self):
+        self.songs = 0  # library rows checked
+        self.missing = 0  # rows newly flagged as missing
+        self.restored = 0  # flagged rows whose file came back
+        self.relocated = 0  # rows re-pointed to a file of the same name in the music folder
+        self.orphans = 0  # unreferenced files moved to the orphaned folder
+        self.bytes_moved = 0
+        self.elapsed = 0.0
+
+
+class LibraryReconciler:
+    """Keeps the songs table and the music folder consistent.
+
+    One pass lists the music folder (and its covers and peaks folders)
+    with a single os.scandir each, then walks the songs table in
+    id-ordered batches.
+    Files inside the music folder are checked against the listing, so
+    they cost no extra stat; only songs imported from elsewhere are
+    stat'ed. A song whose file is gone is re-pointed to a file of the
+    same name in the music folder, which is what happens when the app
+    folder is moved or started from another directory; otherwise it is
+    flagged missing.
+
+    Only waveform peaks are ever reclaimed, and only when no song is
+    missing, since then a stale path can't make a file look unused.
+    They are moved to the orphaned folder rather than deleted. Audio and
+    covers are never touched, and the partial-download folder is left
+    to DownloadJournal.cleanup_orphans.
+
+    Batches are small and separated by a pause, so a pass over a large
+    library stays in the background.
+    """
+
+    def __init__(self, db, music_dir, batch_size=500, pause=0.05, reclaim=True,
+                 grace_seconds=ORPHAN_GRACE_SECONDS, on_done=None):
+        self.db = db
+        self.music_dir = os.path.abspath(music_dir)
+        self.batch_size = batch_size
+        self.pause = pause
+        self.reclaim = reclaim
+        self.grace_seconds = grace_seconds
+        self.on_done = on_done
+
+    def run(self, cancel_event=None):
+        """Reconcile once and return a ReconcileResult."""
+        result = ReconcileResult()
+        started = time.perf_counter()
+        files, by_name = self._list_files()
+
+        after_id = 0
+        still_missing = 0
+        while not (cancel_event is not None and cancel_event.is_set()):
+            rows = self.db.get_song_files(after_id, self.batch_size)
+            if not rows:
+                break
+            after_id = rows[-1][0]
+            still_missing += self._check_batch(rows, files, by_name, result)
+            time.sleep(self.pause)
+        else:
+            # Cancelled part-way: unchecked rows may still reference the files
+            files = {}
+
+        if self.reclaim and not still_missing:
+            self._reclaim(files, result, cancel_event)
+
+        result.elapsed = time.perf_counter() - started
+        print(
+            f"Library check: {result.songs} songs, {result.missing} missing, "
+            f"{result.restored} restored, {result.relocated} relocated, "
+            f"{result.orphans} orphaned files moved aside "
+            f"({result.bytes_moved / (1024 * 1024):.1f} MB) in {result.elapsed:.1f}s"
+        )
+        if self.on_done:
+            try:
+                self.on_done(result)
+            except Exception as e:
+                print(f"Error in reconciler callback: {e}")
+        return result
+
+    def _list_files(self):
+        """List the music folder.
+
+        Returns a map of each library or peaks file to its os.stat result,
+        and a map of each library file's name to its path.
+        """
+        files = {}
+        by_name = {}
+        for folder in (
+            self.music_dir,
+            os.path.join(self.music_dir, 'covers'),
+            os.path.join(self.music_dir, PEAKS_DIR),
+        ):
+            try:
+                with os.scandir(folder) as entries:
+                    for entry in entries:
+                        if not entry.name.endswith(LIBRARY_SUFFIXES + RECLAIM_SUFFIXES):
+                            continue
+                        try:
+                            if entry.is_file(follow_symlinks=False):
+                                files[os.path.normcase(entry.path)] = entry.stat()
+                        except OSError:
+                            continue
+                        if entry.name.endswith(LIBRARY_SUFFIXES):
+                            by_name.setdefault(os.path.normcase(entry.name), entry.path)
+            except FileNotFoundError:
+                continue
+        return files, by_name
+
+    def _exists(self, path, files):
+        key = os.path.normcase(os.path.abspath(path))
+        if os.path.dirname(key) == os.path.normcase(self.music_dir):
+            return key in files or os.path.exists(path)
+        return os.path.exists(path)
+
+    def _check_batch(self, rows, files, by_name, result):
+        """Check one batch of songs; return how many are still missing."""
+        newly_missing = []
+        restored = []
+        moves = []
+        still_missing = 0
+        for song_id, file_path, thumbnail, missing in rows:
+            result.songs += 1
+            exists = self._exists(file_path, files)
+            if not exists:
+                moved_to = by_name.get(os.path.normcase(os.path.basename(file_path)))
+                if moved_to:
+                    if thumbnail and not os.path.exists(thumbnail):
+                        thumbnail = by_name.get(
+                            os.path.normcase(os.path.basename(thumbnail)), thumbnail
+                        )
+                    file_path = moved_to
+                    exists = True
+                    moves.append((song_id, file_path, thumbnail))
+
+            # Referenced files are never orphans, even if the song is missing
+            files.pop(os.path.normcase(os.path.abspath(file_path)), None)
+            files.pop(
+                os.path.normcase(os.path.abspath(peaks_path(file_path, self.music_dir))), None
+            )
+            if thumbnail:
+                files.pop(os.path.normcase(os.path.abspath(thumbnail)), None)
+
+            if not exists:
+                still_missing += 1
+            if not exists and not missing:
+                newly_missing.append(song_id)
+            elif exists and missing:
+                restored.append(song_id)
+        if moves:
+            self.db.relocate_songs(moves)
+            result.relocated += len(moves)
+        if newly_missing:
+            self.db.set_songs_missing(newly_missing, True)
+            result.missing += len(newly_missing)
+        if restored:
+            self.db.set_songs_missing(restored, False)
+            result.restored += len(restored)
+        return still_missing
+
+    def _reclaim(self, files, result, cancel_event=None):
+        cutoff = time.time() - self.grace_seconds
+        orphan_dir = os.path.join(self.music_dir, ORPHAN_DIR)
+        for path, stat in files.items():
+            if cancel_event is not None and cancel_event.is_set():
+                return
+            if not path.endswith(RECLAIM_SUFFIXES) or stat.st_mtime > cutoff:
+                continue
+            try:
+                os.makedirs(orphan_dir, exist_ok=True)
+                os.replace(path, os.path.join(orphan_dir, os.path.basename(path)))
+            except OSError as e:
+                print(f"Error moving orphaned file {path}: {e}")
+                continue
+            result.orphans += 1
+            result.bytes_moved += stat.st_size
@@ -4,8 +4,20 @@ import os
 import ctypes
 from time import sleep
 from database import Database
+from async_database import AsyncDatabase, on_result
 from audio_player import AudioPlayer
 from youtube_downloader import YouTubeDownloader
+from download_manager import DownloadManager, DownloadJob
+from metadata_cache import MetadataCache, video_id_from_url
+from transcoder import Transcoder
+from download_journal import DownloadJournal
+from pipeline_stats import PipelineStats
+from diagnostics import create_diagnostics_sheet
+from waveform import WaveformAnalyzer
+from library_importer import LibraryImporter
+from library_reconciler import LibraryReconciler
+from play_history import PlayHistory
+from waveform_scrubber import WaveformScrubber
 from music_library import create_bottom_sheet
 from queueManager import QueueManager
 from titleBar import TitleBar
@@ -16,6 +28,24 @@ from updatebutton import UpdateButton
 # from appwritehandler import AppwriteHandler
 from firestore_handler import FirestoreHandler
 
+# Number of downloads that may run at the same time
+DOWNLOAD_WORKERS = 3
+# Maximum download progress refreshes per second
+DOWNLOAD_PROGRESS_RATE = 5
+# Pipe downloads straight into FFmpeg instead of writing a temporary .webm
+STREAM_DOWNLOADS = True
+# Encoder profile for new downloads: "mp3_192", "mp3_v2", "opus_96", "aac_128",
+# or "passthrough" to remux Opus/AAC sources without re-encoding
+ENCODER_PROFILE = "mp3_192"
+# Seconds before the end of a song at which the next queue entry is preloaded
+PRELOAD_SECONDS = 5
+# Seconds to crossfade between queue entries (0 for a gapless cut)
+CROSSFADE_SECONDS = 0
+# Seconds after startup before the library is checked against the disk
+RECONCILE_DELAY = 60
+
+# Length of the current song in seconds, updated by the player
+total_duration = 0
 
 def main(page: ft.Page):
     
@@ -46,10 +76,26 @@ def main(page: ft.Page):
     bottom_sheet = ft.BottomSheet(content=ft.Text("Waiting for download..."))
     page.add(bottom_sheet)
     db = Database()
+    # UI handlers query the library through this, never on the event thread
+    async_db = AsyncDatabase(db)
     audio_player = AudioPlayer()
-    youtube_downloader = YouTubeDownloader()
+    pipeline_stats = PipelineStats(db)
+    play_history = PlayHistory(db)
+    download_journal = DownloadJournal(db, os.path.join(os.getcwd(), "_music_", ".partial"))
+    youtube_downloader = YouTubeDownloader(
+        streaming=STREAM_DOWNLOADS,
+        profile=ENCODER_PROFILE,
+        metadata_cache=MetadataCache(db),
+        journal=download_journal,
+        stats=pipeline_stats,
+    )
+    # Drop partial downloads that can no longer be resumed
+    threading.Thread(target=download_journal.cleanup_orphans, daemon=True).start()
+    waveform_analyzer = WaveformAnalyzer(
+        youtube_downloader,
+        on_ready=lambda file_path, peaks: on_waveform_ready(file_path),
+    )
     queue_manager = QueueManager()
-    download_cancel_flag = threading.Event()  # Add cancel flag
     remaining_time_text = ft.Text("00:00", size=16, color=ft.colors.GREEN)
     shareMusic = ShareMusic(page,audio_player,queue_manager,db)
     update_button = UpdateButton(page)
@@ -71,6 +117,7 @@ def main(page: ft.Page):
         width=400,
         active_color=ft.colors.GREEN,
     )
+    waveform_scrubber = WaveformScrubber(seek_slider, width=400)
 
     current_time_text = ft.Text("00:00", size=14)
     total_time_text = ft.Text("00:00", size=14)
@@ -99,6 +146,8 @@ def main(page: ft.Page):
         modes = ["no_loop", "loop_one", "loop_all"]
         current_index = modes.index(queue_manager.loop_mode)
         queue_manager.loop_mode = modes[(current_index + 1) % len(modes)]
+        # The preloaded song may no longer be the one that plays next
+        audio_player.discard_preload()
         update_loop_button()
         # Update next button state based on loop mode
         next_button.disabled = not queue_manager.has_next_song()
@@ -136,9 +185,11 @@ def main(page: ft.Page):
             remaining_time = total_duration - position
             remaining_time_text.value = f"Remaining: {format_time(remaining_time)}"
             total_time_text.value = format_time(remaining_time)
+            waveform_scrubber.set_progress(seek_slider.value / 100)
         else:
             # Reset UI components when no file is playing
             seek_slider.value = 0
+            waveform_scrubber.set_progress(0)
             current_time_text.value = "00:00"
             remaining_time_text.value = "Remaining: 00:00"
 
@@ -169,6 +220,7 @@ def main(page: ft.Page):
 
     # Update the song completion callback
     def on_song_complete():
+        play_history.finish(completed=True)
         if queue_manager.has_next_song():
             play_next_song()
         else:
@@ -181,7 +233,27 @@ def main(page: ft.Page):
             seek_slider.value = 0
         page.update()
 
+    def next_track_path():
+        next_song = queue_manager.peek_next_song()
+        if next_song and os.path.exists(next_song[0]):
+            return next_song[0]
+        return None
+
+    def on_track_change(file_path):
+        # The player already moved on to the preloaded song; catch the queue up
+        play_history.finish(completed=True)
+        next_song = queue_manager.get_next_song()
+        if next_song and next_song[0] == file_path:
+            on_result(
+                async_db.get_song_by_path(file_path),
+                lambda song: show_now_playing(file_path, next_song[1], song),
+            )
+
     # Update your existing callbacks
+    audio_player.preload_window = PRELOAD_SECONDS
+    audio_player.set_crossfade(CROSSFADE_SECONDS)
+    audio_player.set_next_track_provider(next_track_path)
+    audio_player.set_on_track_change_callback(on_track_change)
     audio_player.set_on_complete_callback(on_song_complete)
     audio_player.set_on_duration_callback(on_duration)
     audio_player.set_on_position_update_callback(on_position_update)
@@ -203,7 +275,7 @@ def main(page: ft.Page):
 
     url_input = ft.TextField(
         label="YouTube URL",
-        hint_text="Paste YouTube URL here...",
+        hint_text="Paste one or more YouTube URLs here...",
         width=500,
         bgcolor=ft.colors.with_opacity(0.5,ft.colors.BLACK87)
     )
@@ -266,7 +338,7 @@ def main(page: ft.Page):
 
     # Add seeking controls row
     seeking_row = ft.Row(
-        [current_time_text, seek_slider, total_time_text],
+        [current_time_text, waveform_scrubber, total_time_text],
         alignment=ft.MainAxisAlignment.CENTER,
     )
 
@@ -281,27 +353,42 @@ def main(page: ft.Page):
         padding=10,
     )
 
-    def handle_play_song(file_path, thumbnail):
-  
-        song_info = db.get_song_by_path(file_path)
-      
-        if song_info:
-            now_playing_text.value = f"Now Playing: {song_info[1]}"
-        background_image.src = thumbnail
+    def show_now_playing(file_path, thumbnail, song):
+        play_history.start(song.id if song else None)
+        if song:
+            now_playing_text.value = f"Now Playing: {song.title}"
+        # Imported songs without cover art have no thumbnail
+        background_image.src = thumbnail or "./assets/app_bg.png"
+        if not waveform_scrubber.show(file_path):
+            # Songs without peaks yet are analyzed now and drawn when ready
+            waveform_analyzer.submit(file_path)
+        play_button.icon = ft.icons.PAUSE
+        play_button.disabled = False
+        stop_button.disabled = False
+        next_button.disabled = (
+            len(queue_manager.queue) <= 1
+            or queue_manager.current_index >= len(queue_manager.queue) - 1
+        )
+        prev_button.disabled = queue_manager.current_index <= 0
+        playing_status_text.value = "Playing..."
         page.update()
 
-        if audio_player.play(file_path):
-            play_button.icon = ft.icons.PAUSE
-            play_button.disabled = False
-            stop_button.disabled = False
-            next_button.disabled = (
-                len(queue_manager.queue) <= 1
-                or queue_manager.current_index >= len(queue_manager.queue) - 1
-            )
-            prev_button.disabled = queue_manager.current_index <= 0
-            playing_status_text.value = "Playing..."
-            
+    def handle_play_song(file_path, thumbnail):
+        on_result(
+            async_db.get_song_by_path(file_path),
+            lambda song: start_song(file_path, thumbnail, song),
+        )
+
+    def start_song(file_path, thumbnail, song):
+        if not os.path.exists(file_path):
+            if song:
+                async_db.set_songs_missing([song.id], True)
+            playing_status_text.value = "This song's file is missing"
             page.update()
+            return
+        # The stored duration seeds the seek bar until VLC has parsed the file
+        if audio_player.play(file_path, song.duration if song else None):
+            show_now_playing(file_path, thumbnail, song)
         else:
             playing_status_text.value = "Error playing audio"
             page.update()
@@ -315,11 +402,12 @@ def main(page: ft.Page):
             handle_play_song(file_path, thumbnail)
 
     bs = create_bottom_sheet(
-        db,
+        async_db,
         handle_play_song,
         page,
         on_close=lambda e: page.close(bs),
         on_play_selected=handle_play_selected,
+        importer=LibraryImporter(db, os.path.join(os.getcwd(), "_music_", "covers")),
     )
 
     def open_bottom_sheet(e):
@@ -327,6 +415,14 @@ def main(page: ft.Page):
         page.open(bs)
 
         page.update()
+
+    diagnostics_sheet = create_diagnostics_sheet(
+        pipeline_stats, async_db, page, on_close=lambda e: page.close(diagnostics_sheet)
+    )
+
+    def open_diagnostics(e):
+        page.open(diagnostics_sheet)
+        diagnostics_sheet.refresh()
         
 
     def play_audio(e):
@@ -337,22 +433,35 @@ def main(page: ft.Page):
                 if not audio_player.playing:
                     if audio_player.paused:
                         audio_player.resume()
+                        play_history.resume()
                     else:
-                        success = audio_player.play(file_path)
-                        if not success:
-                            playing_status_text.value = "Error playing audio"
-                            page.update()
-                            return
+                        on_result(
+                            async_db.get_song_by_path(file_path),
+                            lambda song: replay_song(file_path, song),
+                        )
+                        return
                     play_button.icon = ft.icons.PAUSE
                     playing_status_text.value = "Playing..."
                 else:
                     audio_player.pause()
+                    play_history.pause()
                     play_button.icon = ft.icons.PLAY_ARROW
                     playing_status_text.value = "PAUSE"
                 page.update()
 
+    def replay_song(file_path, song):
+        if not audio_player.play(file_path, song.duration if song else None):
+            playing_status_text.value = "Error playing audio"
+            page.update()
+            return
+        play_history.start(song.id if song else None)
+        play_button.icon = ft.icons.PAUSE
+        playing_status_text.value = "Playing..."
+        page.update()
+
     def stop_audio(e):
         audio_player.stop()
+        play_history.finish(completed=False)
         play_button.icon = ft.icons.PLAY_ARROW
         queue_manager.clear_queue()
         next_button.disabled = True
@@ -373,44 +482,124 @@ def main(page: ft.Page):
     next_button.on_click = handle_next
     prev_button.on_click = handle_previous
 
-    def update_progress(progress):
-        if download_cancel_flag.is_set():
-            raise Exception("Download cancelled")
-        download_status_text.value = "" 
+    def format_speed(bytes_per_second):
+        return f"{bytes_per_second / (1024 * 1024):.1f} MB/s"
+
+    def show_active_downloads(active_jobs):
         progress_bar.visible = True
-        progress_bar.value = progress / 100
+        progress_bar.value = sum(j.progress for j in active_jobs) / len(active_jobs) / 100
+        cancel_download_button.visible = True
+        speed = sum(j.speed for j in active_jobs if j.status == DownloadJob.DOWNLOADING)
+        etas = [j.eta for j in active_jobs if j.eta is not None]
+        details = ""
+        if speed > 0:
+            details = f" {format_speed(speed)}"
+            if etas:
+                details += f", {format_time(max(etas))} left"
+        if all(j.status == DownloadJob.CONVERTING or j.progress >= 100 for j in active_jobs):
+            download_status_text.value = "🛠 Converting..."
+        elif len(active_jobs) == 1:
+            download_status_text.value = "Getting high quality audio..." + details
+        else:
+            download_status_text.value = f"Downloading {len(active_jobs)} songs..." + details
 
-        # Check if progress is complete
-        if progress >= 100:
+    def on_download_progress(active_jobs):
+        # Called by the download manager at most a few times per second
+        if active_jobs:
+            show_active_downloads(active_jobs)
+            page.update()
+
+    def on_waveform_ready(file_path):
+        if file_path == waveform_scrubber.file_path:
+            waveform_scrubber.show(file_path)
+            page.update()
+
+    def on_download_job_update(job):
+        active_jobs = download_manager.active_jobs()
+        if job.status == DownloadJob.DONE:
+            if not job.duplicate:
+                waveform_analyzer.submit(job.file_path)
+            play_button.disabled = False
+            stop_button.disabled = False
+
+        if active_jobs:
+            show_active_downloads(active_jobs)
+        else:
             progress_bar.visible = False
-            # Optionally, you can add any additional completion logic here
-            download_status_text.value = "🛠 Converting..." 
+            cancel_download_button.visible = False
+            if job.status == DownloadJob.DONE and job.duplicate:
+                download_status_text.value = "Already in your library!"
+            elif job.status == DownloadJob.DONE:
+                download_status_text.value = "Ready to play!"
+            elif job.status == DownloadJob.CANCELLED:
+                download_status_text.value = "Download cancelled"
+            elif job.status == DownloadJob.FAILED:
+                download_status_text.value = "Error: There was a problem. Please try with a different URL or check your internet connection."
+        page.update()
+
+    download_manager = DownloadManager(
+        youtube_downloader,
+        db,
+        max_workers=DOWNLOAD_WORKERS,
+        on_job_update=on_download_job_update,
+        transcoder=Transcoder(youtube_downloader),
+        on_progress=on_download_progress,
+        progress_rate=DOWNLOAD_PROGRESS_RATE,
+    )
+    # Convert sources that were downloaded but not converted before the app closed
+    threading.Thread(target=download_manager.resume_conversions, daemon=True).start()
+    # Compute waveforms for songs downloaded before waveforms existed
+    threading.Thread(target=waveform_analyzer.backfill, args=(db,), daemon=True).start()
+
+    # Flag songs whose files are gone, re-point moved ones and set unused
+    # waveform files aside, once the app has settled
+    def on_library_checked(result):
+        diagnostics_sheet.show_library_check(result)
+        if (result.missing or result.relocated) and not download_manager.active_jobs():
+            download_status_text.value = (
+                f"Library check: {result.missing} songs missing, "
+                f"{result.relocated} songs found in the music folder"
+            )
         page.update()
 
+    library_reconciler = LibraryReconciler(
+        db, youtube_downloader.downloads_dir, on_done=on_library_checked
+    )
+    # Set on close so a pass in progress stops between batches
+    reconcile_cancel = threading.Event()
+    reconcile_timer = threading.Timer(
+        RECONCILE_DELAY, library_reconciler.run, kwargs={"cancel_event": reconcile_cancel}
+    )
+    reconcile_timer.daemon = True
+    reconcile_timer.start()
+
     def download_thread(url):
         try:
+            existing = download_manager.find_existing_song(video_id_from_url(url))
+            if existing:
+                download_status_text.value = f"Already in your library: {existing[1]}"
+                play_button.disabled = False
+                page.update()
+                return
+
             progress_bar.visible = True
             download_status_text.value = "Getting video info..."
             page.update()
 
             info = youtube_downloader.get_video_info(url)
 
-            if download_cancel_flag.is_set():
-                youtube_downloader.cancel_download()
-                raise Exception("Download cancelled")
-
             def close_dialog(e):
                 rename_dialog.open = False
+                if not download_manager.active_jobs():
+                    download_status_text.value = ""
+                    progress_bar.visible = False
                 page.update()
 
             def confirm_rename(e):
-                nonlocal custom_title
-                custom_title = title_field.value
                 rename_dialog.open = False
                 page.update()
-                continue_download()
+                download_manager.submit(url, title=title_field.value, info=info)
 
-            custom_title = info["original_title"]
             title_field = ft.TextField(
                 value=info["original_title"], label="Enter custom title", width=400
             )
@@ -438,72 +627,36 @@ def main(page: ft.Page):
             rename_dialog.open = True
             page.update()
 
-            def continue_download():
-                if download_cancel_flag.is_set():
-                    print('cancel')
-                    return
-
-                download_status_text.value = "Getting high quality audio..."
-                page.update()
-
-                file_path, thumbnail = youtube_downloader.download(url, update_progress)
-
-                if os.path.exists(file_path):
-                    db.add_song(
-                        custom_title, file_path, thumbnail, info["duration"]
-                    )
-
-                    download_status_text.value = "Ready to play!"
-                    play_button.disabled = False
-                    stop_button.disabled = False
-                    # Clear URL field after successful download
-                    url_input.value = ""
-
-                    page.update()
-                    download_complited()
-                else:
-                    raise Exception(f"File not found: {file_path}")
-
         except Exception as e:
-            if str(e) == "Download cancelled":
-                download_status_text.value = "Download cancelled"
-            else:
-                download_status_text.value = "Error: There was a problem. Please try with a different URL or check your internet connection."
-            play_button.disabled = True
-            stop_button.disabled = True
-        finally:
-            progress_bar.visible = False
-            url_input.disabled = False
-            download_cancel_flag.clear()  # Reset cancel flag
-            download_button.text = "Download"  # Reset button text
-            download_button.style.bgcolor = {ft.MaterialState.DEFAULT: ft.colors.with_opacity(0.5, ft.colors.BLACK87)}
+            youtube_downloader.log_error(f"Error preparing download of {url}: {e}")
+            download_status_text.value = "Error: There was a problem. Please try with a different URL or check your internet connection."
+            progress_bar.visible = bool(download_manager.active_jobs())
             page.update()
 
-    def download_complited():
-        sleep(5)
-        download_status_text.value = ""
-        page.update
-
     def handle_download_button(e):
-       
-        if download_button.text == "Download":
-            if not url_input.value:
-                download_status_text.value = "Please enter a YouTube URL"
-                page.update()
-                return
-            
-            url_input.disabled = True
-            download_button.text = "Cancel Download"
-            download_button.style.bgcolor = {ft.MaterialState.DEFAULT: ft.colors.with_opacity(0.5, ft.colors.RED_300)}
-            download_cancel_flag.clear()
+        urls = url_input.value.split() if url_input.value else []
+        if not urls:
+            download_status_text.value = "Please enter a YouTube URL"
+            page.update()
+            return
+
+        # Clear URL field so the next links can be pasted right away
+        url_input.value = ""
+        page.update()
+
+        if len(urls) == 1:
+            # A single link still gets the rename dialog
             threading.Thread(
-                target=download_thread, args=(url_input.value,), daemon=True
+                target=download_thread, args=(urls[0],), daemon=True
             ).start()
         else:
-            # Cancel download
-            download_cancel_flag.set()
-            download_status_text.value = "Cancelling download..."
-            page.update()
+            for url in urls:
+                download_manager.submit(url)
+
+    def handle_cancel_downloads(e):
+        download_manager.cancel_all()
+        download_status_text.value = "Cancelling download..."
+        page.update()
 
     download_button = ft.ElevatedButton(
             "Download",
@@ -516,6 +669,17 @@ def main(page: ft.Page):
             
             height=50 # Match button height to input field
     )
+
+    cancel_download_button = ft.ElevatedButton(
+            "Cancel Download",
+            on_click=handle_cancel_downloads,
+            visible=False,
+            style=ft.ButtonStyle(
+                color={ft.MaterialState.DEFAULT: ft.colors.WHITE},
+                bgcolor={ft.MaterialState.DEFAULT: ft.colors.with_opacity(0.5, ft.colors.RED_300)},
+            ),
+            height=50
+    )
     
     update_button.show(),
     page.add(
@@ -532,7 +696,7 @@ def main(page: ft.Page):
                         # ft.Text("Tube Player", size=30, weight=ft.FontWeight.BOLD),
                         ft.Container(height=40),
                         ft.Row(
-                            [url_input, download_button],
+                            [url_input, download_button, cancel_download_button],
                             alignment=ft.MainAxisAlignment.CENTER,
                         ),
                         ft.Container(height=20),
@@ -544,7 +708,17 @@ def main(page: ft.Page):
                         video_title,
                         ft.Container(height=20),
                         bottom_container,
-                        ft.ElevatedButton("Music Library", on_click=open_bottom_sheet),
+                        ft.Row(
+                            [
+                                ft.ElevatedButton("Music Library", on_click=open_bottom_sheet),
+                                ft.IconButton(
+                                    icon=ft.icons.QUERY_STATS,
+                                    tooltip="Download Diagnostics",
+                                    on_click=open_diagnostics,
+                                ),
+                            ],
+                            alignment=ft.MainAxisAlignment.CENTER,
+                        ),
                         shareMusic.musicShareButton,
                     ],
                     
@@ -560,14 +734,20 @@ def main(page: ft.Page):
 
 
    
-    def page_cleanup():
-        audio_player.stop()
-        db.conn.close()
-        
-        page.on_close = page_cleanup
+    def page_cleanup(e=None):
+        reconcile_timer.cancel()
+        reconcile_cancel.set()
+        audio_player.close()
+        download_manager.shutdown()
+        waveform_analyzer.shutdown()
+        play_history.close()
+        async_db.close()
+        db.close()
+        firestore_handler.handle_first_launch()
+
+    page.on_close = page_cleanup
     
     # appwritehandler.handle_first_launch()
-        firestore_handler.handle_first_launch()
 if __name__ == "__main__":
     checker = SingleInstanceChecker("Tube Player")  # Use your app's title
     sock = checker.prevent_multiple_instances()
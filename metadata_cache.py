@@ -0,0 +1,115 @@
+import re
+import json
+import time
+import threading
+from collections import OrderedDict
+from urllib.parse import urlparse, parse_qs
+
+# Signed stream URLs are treated as expired this many seconds early
+STREAM_EXPIRY_MARGIN = 300
+
+_VIDEO_ID_PATTERNS = [
+    re.compile(r'(?:youtube\.com|youtube-nocookie\.com)/(?:watch\?(?:.*&)?v=|embed/|shorts/|live/|v/)([A-Za-z0-9_-]{11})'),
+    re.compile(r'youtu\.be/([A-Za-z0-9_-]{11})'),
+]
+
+
+def video_id_from_url(url):
+    """Return the canonical YouTube video id for a URL, or None."""
+    for pattern in _VIDEO_ID_PATTERNS:
+        match = pattern.search(url or '')
+        if match:
+            return match.group(1)
+    return None
+
+
+def stream_url_expiry(stream_url):
+    """Return the unix time a signed googlevideo URL expires, or None."""
+    if not stream_url:
+        return None
+    expire = parse_qs(urlparse(stream_url).query).get('expire')
+    if expire and expire[0].isdigit():
+        return int(expire[0])
+    return None
+
+
+class MetadataCache:
+    """Two-level cache for video info: an in-memory LRU over a SQLite table.
+
+    Entries are keyed by video id and expire after ttl seconds. The signed
+    stream URL inside an entry usually expires sooner; once it has, get()
+    returns the entry without it so callers know to re-extract before
+    streaming.
+    """
+
+    def __init__(self, db, ttl=24 * 3600, max_entries=256, max_rows=5000):
+        self.db = db
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.max_rows = max_rows
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, video_id):
+        """Return cached info for video_id, or None on a miss."""
+        if not video_id:
+            return None
+        now = time.time()
+
+        with self._lock:
+            entry = self._entries.get(video_id)
+            if entry is not None:
+                self._entries.move_to_end(video_id)
+
+        if entry is None:
+            try:
+                row = self.db.get_cached_video_info(video_id)
+            except Exception as e:
+                print(f"Error reading metadata cache: {e}")
+                row = None
+            if row is None:
+                return None
+            entry = (json.loads(row[0]), row[1])
+            self._remember(video_id, entry)
+            try:
+                self.db.touch_cached_video_info(video_id, now)
+            except Exception as e:
+                print(f"Error updating metadata cache: {e}")
+
+        info, fetched_at = entry
+        if now - fetched_at > self.ttl:
+            self.invalidate(video_id)
+            return None
+
+        info = dict(info)
+        expires = stream_url_expiry(info.get('stream_url'))
+        if expires is not None and now > expires - STREAM_EXPIRY_MARGIN:
+            info['stream_url'] = None
+        return info
+
+    def put(self, video_id, info):
+        """Store info for video_id in memory and in the database."""
+        if not video_id:
+            return
+        now = time.time()
+        self._remember(video_id, (dict(info), now))
+        try:
+            self.db.save_cached_video_info(video_id, json.dumps(info), now)
+            self.db.prune_video_info_cache(self.max_rows, now - self.ttl)
+        except Exception as e:
+            print(f"Error writing metadata cache: {e}")
+
+    def invalidate(self, video_id):
+        with self._lock:
+            self._entries.pop(video_id, None)
+        try:
+            self.db.delete_cached_video_info(video_id)
+        except Exception as e:
+            print(f"Error updating metadata cache: {e}")
+
+    def _remember(self, video_id, entry):
+        with self._lock:
+            self._entries[video_id] = entry
+            self._entries.move_to_end(video_id)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
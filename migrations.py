@@ -0,0 +1,209 @@
+import sqlite3
+
+# Schema changes for songs.db, oldest first. The database's
+# PRAGMA user_version records how many have been applied. Never edit or
+# reorder a released migration; append a new one instead.
+
+
+def _create_baseline(cursor):
+    """Tables and columns of databases that predate versioning.
+
+    Older databases have any subset of these, so every step is guarded.
+    """
+    cursor.execute('''
+    CREATE TABLE IF NOT EXISTS songs (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        title TEXT NOT NULL,
+        file_path TEXT UNIQUE NOT NULL,
+        thumbnail TEXT,
+        duration INTEGER,
+        created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+    )
+    ''')
+
+    cursor.execute("PRAGMA table_info(songs)")
+    columns = {row[1] for row in cursor.fetchall()}
+    for column, definition in (
+        ('profile', 'TEXT'),
+        ('video_id', 'TEXT'),
+        ('original_title', 'TEXT'),
+        ('uploader', 'TEXT'),
+        ('tags', 'TEXT'),
+        ('play_count', 'INTEGER NOT NULL DEFAULT 0'),
+    ):
+        if column not in columns:
+            cursor.execute(f"ALTER TABLE songs ADD COLUMN {column} {definition}")
+    cursor.execute(
+        "CREATE UNIQUE INDEX IF NOT EXISTS idx_songs_video_id ON songs(video_id)"
+    )
+
+    # Persistent yt-dlp metadata cache, keyed by YouTube video id
+    cursor.execute('''
+    CREATE TABLE IF NOT EXISTS video_info_cache (
+        video_id TEXT PRIMARY KEY,
+        info TEXT NOT NULL,
+        fetched_at REAL NOT NULL,
+        accessed_at REAL NOT NULL
+    )
+    ''')
+
+    # Partial downloads that can be resumed after a cancel or restart
+    cursor.execute('''
+    CREATE TABLE IF NOT EXISTS download_journal (
+        video_id TEXT PRIMARY KEY,
+        url TEXT NOT NULL,
+        part_path TEXT NOT NULL,
+        bytes_done INTEGER DEFAULT 0,
+        total_bytes INTEGER,
+        updated_at REAL NOT NULL
+    )
+    ''')
+
+    # Per-stage timings for every download (see pipeline_stats.py)
+    cursor.execute('''
+    CREATE TABLE IF NOT EXISTS download_stats (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        job_key TEXT,
+        stage TEXT NOT NULL,
+        started_at REAL NOT NULL,
+        wall_time REAL NOT NULL,
+        cpu_time REAL,
+        bytes INTEGER,
+        error TEXT
+    )
+    ''')
+    cursor.execute(
+        "CREATE INDEX IF NOT EXISTS idx_download_stats_stage ON download_stats(stage, started_at)"
+    )
+
+
+def _add_library_sort_indexes(cursor):
+    """One index per library sort order (see Database.SORT_KEYS)."""
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_songs_created_at ON songs(created_at, id)")
+    cursor.execute(
+        "CREATE INDEX IF NOT EXISTS idx_songs_title ON songs(title COLLATE NOCASE, id)"
+    )
+    cursor.execute(
+        "CREATE INDEX IF NOT EXISTS idx_songs_duration ON songs(IFNULL(duration, 0), id)"
+    )
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_songs_play_count ON songs(play_count, id)")
+
+
+def _add_search_index(cursor):
+    """FTS5 index over songs, kept in sync by triggers.
+
+    Skipped when SQLite was built without FTS5; search then falls back to
+    a LIKE scan.
+    """
+    cursor.execute(
+        "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'songs_fts'"
+    )
+    exists = cursor.fetchone() is not None
+    try:
+        # External-content table: the text lives in songs, the index here
+        cursor.execute('''
+        CREATE VIRTUAL TABLE IF NOT EXISTS songs_fts USING fts5(
+            title, original_title, uploader, tags,
+            content='songs', content_rowid='id',
+            tokenize='unicode61 remove_diacritics 2',
+            prefix='2 3'
+        )
+        ''')
+    except sqlite3.OperationalError as e:
+        print(f"Full-text search unavailable: {e}")
+        return
+
+    cursor.execute('''
+    CREATE TRIGGER IF NOT EXISTS songs_fts_insert AFTER INSERT ON songs BEGIN
+        INSERT INTO songs_fts(rowid, title, original_title, uploader, tags)
+        VALUES (new.id, new.title, new.original_title, new.uploader, new.tags);
+    END
+    ''')
+    cursor.execute('''
+    CREATE TRIGGER IF NOT EXISTS songs_fts_delete AFTER DELETE ON songs BEGIN
+        INSERT INTO songs_fts(songs_fts, rowid, title, original_title, uploader, tags)
+        VALUES ('delete', old.id, old.title, old.original_title, old.uploader, old.tags);
+    END
+    ''')
+    cursor.execute('''
+    CREATE TRIGGER IF NOT EXISTS songs_fts_update
+    AFTER UPDATE OF title, original_title, uploader, tags ON songs BEGIN
+        INSERT INTO songs_fts(songs_fts, rowid, title, original_title, uploader, tags)
+        VALUES ('delete', old.id, old.title, old.original_title, old.uploader, old.tags);
+        INSERT INTO songs_fts(rowid, title, original_title, uploader, tags)
+        VALUES (new.id, new.title, new.original_title, new.uploader, new.tags);
+    END
+    ''')
+    if not exists:
+        # Index the songs added before search existed
+        cursor.execute("INSERT INTO songs_fts(songs_fts) VALUES ('rebuild')")
+
+
+def _add_file_details(cursor):
+    """Audio file details and the last time each song was played."""
+    cursor.execute("ALTER TABLE songs ADD COLUMN file_size INTEGER")
+    cursor.execute("ALTER TABLE songs ADD COLUMN codec TEXT")
+    cursor.execute("ALTER TABLE songs ADD COLUMN bitrate INTEGER")
+    cursor.execute("ALTER TABLE songs ADD COLUMN last_played REAL")
+
+
+def _add_missing_flag(cursor):
+    """Flag set by the reconciler when a song's file is gone from disk."""
+    cursor.execute("ALTER TABLE songs ADD COLUMN missing INTEGER NOT NULL DEFAULT 0")
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_songs_missing ON songs(id) WHERE missing = 1")
+
+
+def _add_play_history(cursor):
+    """One row per time a song was played (see play_history.py)."""
+    cursor.execute('''
+    CREATE TABLE IF NOT EXISTS plays (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        song_id INTEGER NOT NULL,
+        started_at REAL NOT NULL,
+        ended_at REAL NOT NULL,
+        seconds REAL NOT NULL,
+        skipped INTEGER NOT NULL DEFAULT 0
+    )
+    ''')
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_plays_song ON plays(song_id, started_at)")
+    # Library sort by most recently played
+    cursor.execute(
+        "CREATE INDEX IF NOT EXISTS idx_songs_recent ON songs(IFNULL(last_played, 0), id)"
+    )
+
+
+MIGRATIONS = [
+    _create_baseline,
+    _add_library_sort_indexes,
+    _add_search_index,
+    _add_file_details,
+    _add_missing_flag,
+    _add_play_history,
+]
+
+
+def migrate(conn):
+    """Apply pending migrations in one transaction; return the schema version.
+
+    BEGIN IMMEDIATE takes the write lock before user_version is read, so
+    two processes opening the database at once can't both migrate it.
+    """
+    conn.execute('BEGIN IMMEDIATE')
+    try:
+        version = conn.execute('PRAGMA user_version').fetchone()[0]
+        if version > len(MIGRATIONS):
+            print(f"Database schema version {version} is newer than this app ({len(MIGRATIONS)})")
+            conn.rollback()
+            return version
+        cursor = conn.cursor()
+        for migration in MIGRATIONS[version:]:
+            migration(cursor)
+        # PRAGMA doesn't take parameters; the value is always an int
+        cursor.execute(f'PRAGMA user_version = {len(MIGRATIONS)}')
+        conn.commit()
+    except Exception:
+        conn.rollback()
+        raise
+    if version < len(MIGRATIONS):
+        print(f"Migrated database schema from version {version} to {len(MIGRATIONS)}")
+    return len(MIGRATIONS)
@@ -1,108 +1,328 @@
 import flet as ft
 from utils import format_duration
 import math
-def create_bottom_sheet(db, on_play_song, page, on_close, on_play_selected):
-    selected_songs = []
-    playlist_table = ft.DataTable(
-        columns=[
-            ft.DataColumn(ft.Text("Select")),
-            ft.DataColumn(ft.Text("Title")),
-            ft.DataColumn(ft.Text("Duration")),
-            ft.DataColumn(ft.Text("Actions")),
-        ],
-        rows=[],
+import threading
+from itertools import zip_longest
+from async_database import on_result
+
+# Most search results shown at once
+SEARCH_LIMIT = 200
+# Songs loaded per page while scrolling the library
+PAGE_SIZE = 50
+# Load the next page when the list is scrolled this close to its end (pixels)
+LOAD_MORE_THRESHOLD = 300
+# Height of every library row in pixels; rows are positioned by index
+ROW_HEIGHT = 48
+# Rows bound above and below the visible ones, so small scrolls don't rebind
+ROW_OVERSCAN = 5
+# Milliseconds between scroll events
+SCROLL_INTERVAL = 50
+# Title color of songs whose file the library check couldn't find
+MISSING_COLOR = ft.colors.GREY
+
+# Style of the title tooltips, shared by every row
+TOOLTIP_TEXT_STYLE = ft.TextStyle(size=20, color=ft.colors.WHITE)
+TOOLTIP_GRADIENT = ft.LinearGradient(
+    begin=ft.alignment.top_left,
+    end=ft.alignment.Alignment(0.8, 1),
+    colors=[
+        "0xff1f005c",
+        "0xff5b0060",
+        "0xff870160",
+        "0xffac255e",
+        "0xffca485c",
+        "0xffe16b5c",
+        "0xfff39060",
+        "0xffffb56b",
+    ],
+    tile_mode=ft.GradientTileMode.MIRROR,
+    rotation=math.pi / 3,
+)
+
+SORT_OPTIONS = [
+    ("created_at", "Newest"),
+    ("title", "Title"),
+    ("duration", "Duration"),
+    ("play_count", "Most played"),
+    ("last_played", "Recently played"),
+]
+
+def row_pool_size(viewport):
+    """Row controls needed to fill a viewport of `viewport` pixels plus overscan."""
+    return math.ceil(viewport / ROW_HEIGHT) + 2 * ROW_OVERSCAN
+
+
+def create_bottom_sheet(async_db, on_play_song, page, on_close, on_play_selected, importer=None):
+    # Selected songs by id, in the order they were ticked
+    selected_songs = {}
+    import_status = ft.Text("", size=14, color=ft.colors.GREEN)
+    search_field = ft.TextField(
+        hint_text="Search title, artist or tags...",
+        prefix_icon=ft.icons.SEARCH,
+        dense=True,
+        expand=True,
+        on_change=lambda e: handle_search(),
     )
+    sort_dropdown = ft.Dropdown(
+        value="created_at",
+        options=[ft.dropdown.Option(key, label) for key, label in SORT_OPTIONS],
+        width=150,
+        dense=True,
+        on_change=lambda e: handle_search(),
+    )
+    # Cursor of the next library page (None when everything is loaded),
+    # whether a page is being fetched, and a counter that lets results of
+    # superseded queries be dropped
+    paging = {"cursor": None, "loading": False, "generation": 0}
+    # Songs loaded so far; only as many as fill the viewport have controls
+    # at a time, between two spacers standing in for the rows above and
+    # below. songs is changed on the database thread and read on the UI
+    # thread, so both hold view_lock.
+    songs = []
+    # The window height is the largest the list can be until the first
+    # scroll event reports the real viewport
+    view = {"first": None, "pixels": 0.0, "viewport": page.window.height or 720}
+    view_lock = threading.RLock()
+    top_spacer = ft.Container(height=0)
+    bottom_spacer = ft.Container(height=0)
 
     def handle_delete_song(song_id):
-        db.delete_song(song_id)
-        update_table()
-        page.update()
+        on_result(async_db.delete_songs([song_id]), lambda deleted: update_table())
+
+    def handle_delete_selected():
+        if selected_songs:
+            # One transaction for the whole selection
+            on_result(async_db.delete_songs(list(selected_songs)), lambda deleted: update_table())
+
+    def set_selection_buttons():
+        play_selected_button.disabled = len(selected_songs) == 0
+        delete_selected_button.disabled = len(selected_songs) == 0
 
-    def handle_checkbox_change(e, file_path, thumbnail):
+    def handle_checkbox_change(e):
+        song = e.control.data
         if e.control.value:
-            selected_songs.append((file_path, thumbnail))
+            selected_songs[song.id] = (song.file_path, song.thumbnail)
         else:
-            selected_songs.remove((file_path, thumbnail))
-        play_selected_button.disabled = len(selected_songs) == 0
+            selected_songs.pop(song.id, None)
+        set_selection_buttons()
         page.update()
 
     def play_selected_songs():
         if selected_songs:
-            on_play_selected(selected_songs)
+            on_play_selected(list(selected_songs.values()))
             page.close(bottom_sheet)
 
+    def show_import_progress(progress):
+        state = "Imported" if progress.done else "Importing..."
+        import_status.value = (
+            f"{state} {progress.imported} new of {progress.scanned} files "
+            f"({progress.files_per_second:.0f} files/s)"
+        )
+        if progress.failed:
+            import_status.value += f", {progress.failed} unreadable"
+        page.update()
+
+    def run_import(folder):
+        try:
+            importer.import_folder(folder)
+        except Exception as e:
+            print(f"Error importing {folder}: {e}")
+            import_status.value = f"Import failed: {e}"
+        import_button.disabled = False
+        update_table()
+        page.update()
+
+    def handle_folder_picked(e):
+        if not e.path:
+            return
+        import_button.disabled = True
+        import_status.value = "Scanning..."
+        page.update()
+        threading.Thread(target=run_import, args=(e.path,), daemon=True).start()
+
+    folder_picker = ft.FilePicker(on_result=handle_folder_picked)
+    page.overlay.append(folder_picker)
+    import_button = ft.IconButton(
+        icon=ft.icons.CREATE_NEW_FOLDER,
+        tooltip="Import Folder",
+        visible=importer is not None,
+        on_click=lambda e: folder_picker.get_directory_path(dialog_title="Import music folder"),
+    )
+    if importer is not None:
+        importer.on_progress = show_import_progress
+
+    def handle_search():
+        update_table()
+
     def update_table():
-        playlist_table.rows.clear()
-        songs = db.get_all_songs()
+        """Reload the first page (or the search results) without blocking."""
+        paging["generation"] += 1
+        generation = paging["generation"]
+        paging["loading"] = True
+        query = (search_field.value or "").strip()
+        if query:
+            future = async_db.search_songs(query, SEARCH_LIMIT)
+            on_result(future, lambda songs: show_songs(generation, songs, None))
+        else:
+            future = async_db.get_songs_page(sort_dropdown.value, limit=PAGE_SIZE)
+            on_result(future, lambda result: show_songs(generation, *result))
+
+    def show_songs(generation, results, cursor):
+        if generation != paging["generation"]:
+            return  # The query changed while this one ran
         selected_songs.clear()
-        
-        for song in songs:
-            song_id, title, file_path, thumbnail, duration, _ = song
-            
-            checkbox = ft.Checkbox(
-                value=False,
-                on_change=lambda e, fp=file_path, tn=thumbnail: handle_checkbox_change(e, fp, tn)
-            )
-            
-            # play_button = ft.IconButton(
-            #     icon=ft.icons.PLAY_CIRCLE,
-            #     icon_color=ft.colors.GREEN,
-            #     data=file_path,
-            #     tooltip="Play",
-            #     on_click=lambda e, fp=file_path, tn=thumbnail: on_play_song(fp, tn)
-            # )
-            play_button = ft.Text('')
-
-            
-            delete_button = ft.IconButton(
-                icon=ft.icons.DELETE,
-                icon_color=ft.colors.RED,
-                data=song_id,
-                tooltip="Delete",
-                on_click=lambda e, sid=song_id: handle_delete_song(sid)
-            )
-
-                        # Create the title widget with tooltip and ellipsis
-            title_widget =ft.Text(
-                title, 
-                width=200,
-                overflow=ft.TextOverflow.ELLIPSIS,
-                tooltip=ft.Tooltip(
-                message= title,
+        set_selection_buttons()
+        paging["cursor"] = cursor
+        paging["loading"] = False
+        with view_lock:
+            songs[:] = results
+            render(0.0, force=True)
+        if list_view.page is not None:
+            list_view.scroll_to(offset=0, duration=0)
+        page.update()
+
+    def load_more():
+        if paging["cursor"] is None or paging["loading"]:
+            return
+        paging["loading"] = True
+        generation = paging["generation"]
+        future = async_db.get_songs_page(sort_dropdown.value, paging["cursor"], PAGE_SIZE)
+        on_result(future, lambda result: append_songs(generation, *result))
+
+    def append_songs(generation, results, cursor):
+        if generation != paging["generation"]:
+            return
+        paging["cursor"] = cursor
+        paging["loading"] = False
+        if results:
+            with view_lock:
+                songs.extend(results)
+                render(view["pixels"], force=True)
+            page.update()
+
+    def render(pixels, force=False):
+        """Bind the row pool to the songs around scroll offset pixels.
+
+        Returns False when the bound rows didn't change, so the caller can
+        skip page.update().
+        """
+        with view_lock:
+            view["pixels"] = pixels
+            first = max(0, int(pixels // ROW_HEIGHT) - ROW_OVERSCAN)
+            first = min(first, max(0, len(songs) - len(row_pool)))
+            if first == view["first"] and not force:
+                return False
+            view["first"] = first
+            window = songs[first:first + len(row_pool)]
+            for slot, song in zip_longest(row_pool, window):
+                if song is None:
+                    slot.visible = False
+                else:
+                    bind_row(slot, song)
+            top_spacer.height = first * ROW_HEIGHT
+            bottom_spacer.height = (len(songs) - first - len(window)) * ROW_HEIGHT
+            return True
+
+    def grow_pool(viewport):
+        """Add row controls until the pool fills the viewport; True if any were added."""
+        with view_lock:
+            missing = row_pool_size(viewport) - len(row_pool)
+            if missing <= 0:
+                return False
+            rows = [create_row() for _ in range(missing)]
+            row_pool.extend(rows)
+            # Keep the bottom spacer last
+            list_view.controls[-1:-1] = rows
+            return True
+
+    def handle_scroll(e):
+        grown = False
+        if e.viewport_dimension:
+            view["viewport"] = e.viewport_dimension
+            grown = grow_pool(e.viewport_dimension)
+        with view_lock:
+            changed = render(e.pixels, force=grown)
+            loaded_height = len(songs) * ROW_HEIGHT
+        if loaded_height - (e.pixels + view["viewport"]) < LOAD_MORE_THRESHOLD:
+            load_more()
+        if changed:
+            page.update()
+
+    def create_row():
+        """Build one pooled row; bind_row() points it at a song."""
+        checkbox = ft.Checkbox(value=False, on_change=handle_checkbox_change)
+
+        # play_button = ft.IconButton(
+        #     icon=ft.icons.PLAY_CIRCLE,
+        #     icon_color=ft.colors.GREEN,
+        #     tooltip="Play",
+        #     on_click=lambda e: on_play_song(e.control.data.file_path, e.control.data.thumbnail)
+        # )
+
+        delete_button = ft.IconButton(
+            icon=ft.icons.DELETE,
+            icon_color=ft.colors.RED,
+            tooltip="Delete",
+            on_click=lambda e: handle_delete_song(e.control.data)
+        )
+
+        # Title with tooltip and ellipsis
+        title_widget = ft.Text(
+            "",
+            expand=True,
+            overflow=ft.TextOverflow.ELLIPSIS,
+            tooltip=ft.Tooltip(
+                message="",
                 padding=20,
-                vertical_offset= -100,
+                vertical_offset=-100,
                 border_radius=10,
-                text_style=ft.TextStyle(size=20, color=ft.colors.WHITE),
-                gradient=ft.LinearGradient(
-                    begin=ft.alignment.top_left,
-                    end=ft.alignment.Alignment(0.8, 1),
-                    colors=[
-                        "0xff1f005c",
-                        "0xff5b0060",
-                        "0xff870160",
-                        "0xffac255e",
-                        "0xffca485c",
-                        "0xffe16b5c",
-                        "0xfff39060",
-                        "0xffffb56b",
-                    ],
-                    tile_mode=ft.GradientTileMode.MIRROR,
-                    rotation=math.pi / 3,
-                ),
-            )
-            )
-            
-
-            playlist_table.rows.append(
-                ft.DataRow(
-                    cells=[
-                        ft.DataCell(checkbox),
-                        ft.DataCell(title_widget),
-                        ft.DataCell(ft.Text(format_duration(duration))),
-                        ft.DataCell(ft.Row([play_button, delete_button])),
-                    ]
-                )
-            )
+                text_style=TOOLTIP_TEXT_STYLE,
+                gradient=TOOLTIP_GRADIENT,
+            ),
+        )
+
+        return ft.Container(
+            height=ROW_HEIGHT,
+            visible=False,
+            content=ft.Row(
+                controls=[
+                    ft.Container(checkbox, width=70),
+                    title_widget,
+                    ft.Text("", width=90),
+                    ft.Container(delete_button, width=60),
+                ],
+            ),
+        )
+
+    def bind_row(row, song):
+        checkbox_cell, title_widget, duration_text, actions_cell = row.content.controls
+        checkbox_cell.content.data = song
+        checkbox_cell.content.value = song.id in selected_songs
+        title_widget.value = song.title
+        title_widget.color = MISSING_COLOR if song.missing else None
+        title_widget.tooltip.message = (
+            f"{song.title} (file missing)" if song.missing else song.title
+        )
+        duration_text.value = format_duration(song.duration)
+        actions_cell.content.data = song.id
+        row.visible = True
+
+    row_pool = [create_row() for _ in range(row_pool_size(view["viewport"]))]
+    list_view = ft.ListView(
+        controls=[top_spacer, *row_pool, bottom_spacer],
+        expand=True,
+        # Rows are rebound and further pages loaded as the list scrolls
+        on_scroll=handle_scroll,
+        on_scroll_interval=SCROLL_INTERVAL,
+    )
+    table_header = ft.Row(
+        controls=[
+            ft.Text("Select", width=70),
+            ft.Text("Title", expand=True),
+            ft.Text("Duration", width=90),
+            ft.Text("Actions", width=60),
+        ],
+    )
 
     play_selected_button = ft.ElevatedButton(
         "Play Selected",
@@ -110,9 +330,17 @@ def create_bottom_sheet(db, on_play_song, page, on_close, on_play_selected):
         on_click=lambda _: play_selected_songs(),
         disabled=True
     )
+    delete_selected_button = ft.IconButton(
+        icon=ft.icons.DELETE_SWEEP,
+        icon_color=ft.colors.RED,
+        tooltip="Delete Selected",
+        on_click=lambda _: handle_delete_selected(),
+        disabled=True
+    )
 
     def handle_on_dismiss():
         play_selected_button.disabled = True
+        delete_selected_button.disabled = True
 
     bottom_sheet = ft.BottomSheet(
             on_dismiss=lambda e: handle_on_dismiss(),
@@ -125,20 +353,23 @@ def create_bottom_sheet(db, on_play_song, page, on_close, on_play_selected):
                         ft.Row(
                             controls=[
                                 ft.Text("Music Library", size=20, weight=ft.FontWeight.BOLD),
-                                ft.IconButton(icon=ft.icons.CLOSE, on_click=on_close),
+                                ft.Row(
+                                    controls=[
+                                        import_button,
+                                        ft.IconButton(icon=ft.icons.CLOSE, on_click=on_close),
+                                    ]
+                                ),
                             ],
                             alignment=ft.MainAxisAlignment.SPACE_BETWEEN,
                         ),
                         ft.Row(
-                            controls=[play_selected_button],
+                            controls=[search_field, sort_dropdown, play_selected_button, delete_selected_button],
                             alignment=ft.MainAxisAlignment.END,
                         ),
+                        import_status,
+                        table_header,
                         ft.Container(
-                            content=ft.ListView(
-                                controls=[playlist_table],  # Add playlist_table to ListView for scrolling
-                                expand=True,
-                                auto_scroll=True,  # Automatically scroll to the end if new items are added
-                            ),
+                            content=list_view,
                             expand=True,  # Ensure it takes up all available space
                         ),
                     ],
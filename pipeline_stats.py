@@ -0,0 +1,206 @@
+import time
+import threading
+import subprocess
+from contextlib import contextmanager
+
+import psutil
+
+from utils import percentile
+
+# Stage names recorded by YouTubeDownloader and DownloadManager
+STAGE_INFO = "info"
+STAGE_FETCH = "fetch"
+STAGE_STREAM = "stream"
+STAGE_CONVERT = "convert"
+STAGE_THUMBNAIL = "thumbnail"
+STAGE_LIBRARY = "library"
+STAGE_WAVEFORM = "waveform"
+STAGES = [
+    STAGE_INFO, STAGE_FETCH, STAGE_STREAM, STAGE_CONVERT, STAGE_THUMBNAIL, STAGE_LIBRARY,
+    STAGE_WAVEFORM,
+]
+# Runs kept per stage in download_stats; older ones are pruned
+MAX_ROWS_PER_STAGE = 2000
+# Records between two prunes of download_stats
+PRUNE_INTERVAL = 100
+
+
+def process_cpu_time(process):
+    """CPU seconds used so far by a child process, or 0 if it has exited."""
+    try:
+        times = psutil.Process(process.pid).cpu_times()
+        return times.user + times.system
+    except (psutil.Error, OSError):
+        return 0.0
+
+
+def wait_with_cpu(process, poll_interval=0.2):
+    """Wait for a child process and return the CPU seconds it used.
+
+    The process can't be queried after it exits, so its CPU time is sampled
+    while it runs and the last sample is returned.
+    """
+    cpu = 0.0
+    while True:
+        cpu = process_cpu_time(process) or cpu
+        try:
+            process.wait(timeout=poll_interval)
+            return cpu
+        except subprocess.TimeoutExpired:
+            continue
+
+
+class StageTimer:
+    """Times one pipeline stage: wall time, CPU time and bytes moved."""
+
+    def __init__(self, stats, job_key, stage):
+        self.stats = stats
+        self.job_key = job_key
+        self.stage = stage
+        self.bytes = 0
+        self.child_cpu = 0.0
+        self.error = None
+
+    def add_bytes(self, count):
+        self.bytes += count
+
+    def fail(self, message):
+        """Record the stage as failed without raising."""
+        self.error = message
+
+    def add_cpu(self, seconds):
+        """Add CPU time spent in a child process (e.g. FFmpeg)."""
+        self.child_cpu += seconds
+
+    def __enter__(self):
+        self.started_at = time.time()
+        self._wall_start = time.perf_counter()
+        self._cpu_start = time.thread_time()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        wall = time.perf_counter() - self._wall_start
+        cpu = time.thread_time() - self._cpu_start + self.child_cpu
+        error = str(exc) if exc is not None else self.error
+        self.stats.record(
+            self.job_key, self.stage, self.started_at, wall, cpu, self.bytes, error
+        )
+        return False
+
+
+class _NullTimer:
+    """Stand-in used when no PipelineStats is configured."""
+
+    def add_bytes(self, count):
+        pass
+
+    def fail(self, message):
+        pass
+
+    def add_cpu(self, seconds):
+        pass
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        return False
+
+
+NULL_TIMER = _NullTimer()
+
+
+class PipelineStats:
+    """Records per-stage download timings in the download_stats table."""
+
+    def __init__(self, db, sample_size=500, max_rows_per_stage=MAX_ROWS_PER_STAGE):
+        self.db = db
+        self.sample_size = sample_size
+        self.max_rows_per_stage = max(max_rows_per_stage, sample_size)
+        self._local = threading.local()
+        self._records = 0
+        self._records_lock = threading.Lock()
+        self.prune()
+
+    def prune(self):
+        """Drop all but the newest max_rows_per_stage runs of each stage."""
+        for stage in STAGES:
+            try:
+                self.db.prune_download_stats(stage, self.max_rows_per_stage)
+            except Exception as e:
+                print(f"Error pruning download stats: {e}")
+
+    @contextmanager
+    def bind(self, job_key):
+        """Attribute stages timed on this thread to job_key."""
+        previous = getattr(self._local, "job_key", None)
+        self._local.job_key = job_key
+        try:
+            yield
+        finally:
+            self._local.job_key = previous
+
+    def stage(self, stage, default_key=None):
+        """Return a StageTimer for one stage.
+
+        The stage is attributed to the job bound on this thread, or to
+        default_key when none is bound.
+        """
+        job_key = getattr(self._local, "job_key", None) or default_key
+        return StageTimer(self, job_key, stage)
+
+    def record(self, job_key, stage, started_at, wall_time, cpu_time, byte_count, error=None):
+        try:
+            self.db.add_download_stat(
+                job_key, stage, started_at, wall_time, cpu_time, byte_count, error
+            )
+        except Exception as e:
+            print(f"Error recording download stats: {e}")
+            return
+        with self._records_lock:
+            self._records += 1
+            due = self._records % PRUNE_INTERVAL == 0
+        if due:
+            self.prune()
+
+    def summary(self):
+        """Return p50/p95 summaries for each stage over recent samples.
+
+        Maps stage name to a dict with count, errors, wall/cpu percentiles
+        in seconds and throughput percentiles in bytes per second.
+        """
+        result = {}
+        for stage in STAGES:
+            rows = self.db.get_download_stats(stage, self.sample_size)
+            ok = [row for row in rows if row[3] is None]
+            if not rows:
+                continue
+            walls = [row[0] for row in ok]
+            cpus = [row[1] for row in ok]
+            throughputs = [row[2] / row[0] for row in ok if row[2] and row[0] > 0]
+            result[stage] = {
+                "count": len(rows),
+                "errors": len(rows) - len(ok),
+                "wall_p50": percentile(walls, 50),
+                "wall_p95": percentile(walls, 95),
+                "cpu_p50": percentile(cpus, 50),
+                "cpu_p95": percentile(cpus, 95),
+                "throughput_p50": percentile(throughputs, 50),
+                "throughput_p95": percentile(throughputs, 95),
+            }
+        return result
+
+    def bottleneck(self, summary=None):
+        """Describe whether recent downloads were network- or encode-bound."""
+        summary = summary if summary is not None else self.summary()
+        stream = summary.get(STAGE_STREAM)
+        if stream and stream["wall_p50"]:
+            # In a streamed download FFmpeg runs alongside the transfer; if
+            # it kept a core busy most of the time, encoding held it back
+            busy = (stream["cpu_p50"] or 0) / stream["wall_p50"]
+            return "encode-bound" if busy > 0.8 else "network-bound"
+        fetch = summary.get(STAGE_FETCH, {}).get("wall_p50")
+        convert = summary.get(STAGE_CONVERT, {}).get("wall_p50")
+        if fetch is None or convert is None:
+            return "not enough data"
+        return "encode-bound" if convert > fetch else "network-bound"
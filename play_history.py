@@ -0,0 +1,99 @@
+import time
+import threading
+
+# A play that isn't finished still counts once this much was heard
+COUNTED_MIN_SECONDS = 30
+
+
+class PlayHistory:
+    """Records listening history without making playback wait on SQLite.
+
+    start(), pause(), resume() and finish() only update fields in memory
+    and append finished plays to a buffer. A background thread writes
+    the buffer every flush_interval seconds, sooner once max_buffer
+    plays are waiting, and close() writes whatever is left. Each flush
+    inserts the plays and bumps play_count and last_played on the songs
+    in one transaction.
+    """
+
+    def __init__(self, db, flush_interval=30.0, max_buffer=50):
+        self.db = db
+        self.flush_interval = flush_interval
+        self.max_buffer = max_buffer
+        self._buffer = []
+        self._lock = threading.Lock()
+        self._current = None  # [song_id, started_at, listened, resumed_at]
+        self._wake = threading.Event()
+        self._closed = False
+        self._thread = threading.Thread(target=self._run, daemon=True, name="play-history")
+        self._thread.start()
+
+    def start(self, song_id):
+        """A song started playing; any play in progress ends as skipped."""
+        now = time.time()
+        with self._lock:
+            self._end_current(now, completed=False)
+            if song_id is not None:
+                self._current = [song_id, now, 0.0, now]
+
+    def pause(self):
+        now = time.time()
+        with self._lock:
+            if self._current and self._current[3] is not None:
+                self._current[2] += now - self._current[3]
+                self._current[3] = None
+
+    def resume(self):
+        with self._lock:
+            if self._current and self._current[3] is None:
+                self._current[3] = time.time()
+
+    def finish(self, completed=True):
+        """The current play ended, by reaching the end of the song or by a stop."""
+        with self._lock:
+            self._end_current(time.time(), completed)
+
+    def flush(self):
+        """Write buffered plays now."""
+        with self._lock:
+            plays, self._buffer = self._buffer, []
+        if not plays:
+            return
+        counts = {}
+        last_played = {}
+        for song_id, started_at, ended_at, seconds, skipped in plays:
+            if not skipped or seconds >= COUNTED_MIN_SECONDS:
+                counts[song_id] = counts.get(song_id, 0) + 1
+            last_played[song_id] = max(last_played.get(song_id, 0), started_at)
+        try:
+            self.db.add_plays(plays, counts, last_played)
+        except Exception as e:
+            print(f"Error saving play history: {e}")
+            with self._lock:
+                # Keep them for the next flush
+                self._buffer[:0] = plays
+
+    def close(self):
+        """End the current play and write everything still buffered."""
+        self.finish(completed=False)
+        self._closed = True
+        self._wake.set()
+        self._thread.join(timeout=5)
+        self.flush()
+
+    def _end_current(self, now, completed):
+        if self._current is None:
+            return
+        song_id, started_at, listened, resumed_at = self._current
+        if resumed_at is not None:
+            listened += now - resumed_at
+        self._buffer.append((song_id, started_at, now, listened, 0 if completed else 1))
+        self._current = None
+        if len(self._buffer) >= self.max_buffer:
+            self._wake.set()
+
+    def _run(self):
+        while not self._closed:
+            self._wake.wait(self.flush_interval)
+            self._wake.clear()
+            self.flush()
@@ -0,0 +1,216 @@
+import os
+import sys
+import ctypes
+import threading
+
+# Global vlc import after DLL loading
+vlc = None
+
+
+class VlcBackend:
+    """Plays audio through the VLC copy bundled in assets/vlc.
+
+    Players and media are python-vlc objects. Their events are forwarded
+    to on_event(kind, value, source) with kind one of 'playing', 'end',
+    'position' (milliseconds), or 'length' (milliseconds).
+    """
+
+    def __init__(self):
+        # Get the directory where the script or executable is located
+        if getattr(sys, 'frozen', False):
+            # If running as a packaged executable
+            base_path = os.path.dirname(sys.executable)
+        else:
+            # If running as a script
+            base_path = os.path.dirname(os.path.abspath(__file__))
+
+        # VLC folder in the "assets" directory next to the executable or script
+        vlc_path = os.path.join(base_path, 'assets', 'vlc')
+
+        # Ensure the VLC folder exists
+        if not os.path.exists(vlc_path):
+            raise Exception(f"VLC directory not found at: {vlc_path}")
+
+        if sys.platform.startswith('win'):
+            # Add VLC directory to DLL search paths
+            os.add_dll_directory(vlc_path)
+
+            # Load VLC DLLs from assets/vlc folder
+            libvlccore_path = os.path.join(vlc_path, 'libvlccore.dll')
+            libvlc_path = os.path.join(vlc_path, 'libvlc.dll')
+
+            if not os.path.exists(libvlccore_path) or not os.path.exists(libvlc_path):
+                raise Exception("Required VLC DLLs not found in assets/vlc folder")
+
+            # Load the DLLs
+            ctypes.CDLL(libvlccore_path)
+            ctypes.CDLL(libvlc_path)
+
+            # Add VLC plugins path to environment
+            plugin_path = os.path.join(vlc_path, 'plugins')
+
+            # Set PATH environment variable to include VLC path for additional DLLs
+            os.environ['PATH'] = vlc_path + os.pathsep + os.environ['PATH']
+        else:
+            # Linux/Mac plugin path
+            plugin_path = os.path.join(vlc_path, 'plugins')
+
+        # Import VLC module globally after DLLs are loaded
+        global vlc
+        import vlc
+
+        # Create VLC instance with plugin path
+        self.instance = vlc.Instance(
+            '--no-xlib',
+            f'--plugin-path={plugin_path}',
+        )
+
+    def new_player(self, on_event):
+        """Create a media player whose events go to on_event."""
+        media_player = self.instance.media_player_new()
+        event_manager = media_player.event_manager()
+        event_manager.event_attach(
+            vlc.EventType.MediaPlayerPlaying,
+            lambda event: on_event('playing', None, media_player)
+        )
+        event_manager.event_attach(
+            vlc.EventType.MediaPlayerEndReached,
+            lambda event: on_event('end', None, media_player)
+        )
+        event_manager.event_attach(
+            vlc.EventType.MediaPlayerEncounteredError,
+            lambda event: on_event('end', None, media_player)
+        )
+        event_manager.event_attach(
+            vlc.EventType.MediaPlayerTimeChanged,
+            lambda event: on_event('position', event.u.new_time, media_player)
+        )
+        event_manager.event_attach(
+            vlc.EventType.MediaPlayerLengthChanged,
+            lambda event: on_event('length', event.u.new_length, media_player)
+        )
+        return media_player
+
+    def open_media(self, file_path, on_event):
+        """Create a media and start parsing it in the background.
+
+        VLC reports the parsed duration via MediaDurationChanged, which is
+        forwarded as a 'length' event from the media.
+        """
+        media = self.instance.media_new(file_path)
+        media.event_manager().event_attach(
+            vlc.EventType.MediaDurationChanged,
+            lambda event: on_event('length', event.u.new_duration, media)
+        )
+        media.parse_with_options(vlc.MediaParseFlag.local, -1)
+        return media
+
+
+class SimulatedMedia:
+    __slots__ = ("file_path", "duration")
+
+    def __init__(self, file_path, duration):
+        self.file_path = file_path
+        self.duration = duration  # milliseconds
+
+    def get_duration(self):
+        return self.duration
+
+
+class SimulatedPlayer:
+    """Media player stand-in that only moves when its backend's clock does."""
+
+    def __init__(self, backend, on_event):
+        self.backend = backend
+        self.on_event = on_event
+        self.media = None
+        self.position = 0  # milliseconds
+        self.volume = 100
+        self.playing = False
+        self.play_calls = 0
+
+    def set_media(self, media):
+        self.media = media
+        self.position = 0
+        self.playing = False
+
+    def play(self):
+        if self.media is None:
+            return -1
+        if not self.playing and self.position == 0:
+            # Like VLC's LengthChanged when a media starts
+            self.on_event('length', self.media.duration, self)
+        self.playing = True
+        self.play_calls += 1
+        self.on_event('playing', None, self)
+        return 0
+
+    def pause(self):
+        self.playing = False
+
+    def set_pause(self, do_pause):
+        if do_pause:
+            self.playing = False
+        else:
+            self.play()
+
+    def stop(self):
+        self.playing = False
+        self.position = 0
+
+    def set_time(self, milliseconds):
+        self.position = max(0, min(milliseconds, self.get_length()))
+
+    def get_length(self):
+        return self.media.duration if self.media else 0
+
+    def audio_set_volume(self, volume):
+        self.volume = volume
+
+    def _advance(self, milliseconds):
+        if not self.playing:
+            return
+        self.position = min(self.position + milliseconds, self.media.duration)
+        self.on_event('position', self.position, self)
+        if self.position >= self.media.duration:
+            self.playing = False
+            self.on_event('end', None, self)
+
+
+class NullBackend:
+    """Backend without audio output, driven by a virtual clock.
+
+    Nothing plays until advance() is called; each call moves every playing
+    player forward and fires the same 'position' and 'end' events VLC
+    would. Media durations come from duration_for(file_path), in seconds,
+    and are reported when a player starts the media. Useful for tests and
+    benchmarks on machines without VLC.
+    """
+
+    def __init__(self, duration_for=None, default_duration=180.0):
+        self.duration_for = duration_for
+        self.default_duration = default_duration
+        self.now = 0.0  # virtual seconds
+        self.players = []
+        self._lock = threading.Lock()
+
+    def new_player(self, on_event):
+        player = SimulatedPlayer(self, on_event)
+        with self._lock:
+            self.players.append(player)
+        return player
+
+    def open_media(self, file_path, on_event):
+        seconds = self.duration_for(file_path) if self.duration_for else None
+        return SimulatedMedia(file_path, int((seconds or self.default_duration) * 1000))
+
+    def advance(self, seconds, step=0.25):
+        """Move the virtual clock forward, firing events every `step` seconds."""
+        while seconds > 1e-9:
+            elapsed = min(step, seconds)
+            seconds -= elapsed
+            with self._lock:
+                self.now += elapsed
+                players = list(self.players)
+            for player in players:
+                player._advance(int(round(elapsed * 1000)))
@@ -0,0 +1,107 @@
+import time
+import threading
+
+
+class ProgressSnapshot:
+    """Smoothed progress of one download at the time of a tick."""
+
+    __slots__ = ("key", "downloaded", "total", "percent", "speed", "eta")
+
+    def __init__(self, key, downloaded, total, percent, speed, eta):
+        self.key = key
+        self.downloaded = downloaded
+        self.total = total
+        self.percent = percent
+        self.speed = speed  # bytes per second
+        self.eta = eta  # seconds, or None while unknown
+
+
+class _Tracker:
+    __slots__ = ("downloaded", "total", "last_downloaded", "last_time", "speed")
+
+    def __init__(self):
+        self.downloaded = 0
+        self.total = None
+        self.last_downloaded = 0
+        self.last_time = time.perf_counter()
+        self.speed = 0.0
+
+
+class ProgressAggregator:
+    """Coalesces per-chunk progress into one callback per tick.
+
+    update() is cheap and only records the latest byte counts. A single
+    background thread wakes at most `rate` times per second while anything
+    changed, computes a smoothed speed and ETA for every active download,
+    and hands them all to on_tick in one call.
+    """
+
+    def __init__(self, on_tick, rate=5.0, smoothing=0.3):
+        self.on_tick = on_tick
+        self.interval = 1.0 / rate
+        self.smoothing = smoothing
+        self._trackers = {}
+        self._lock = threading.Lock()
+        self._dirty = threading.Event()
+        self._stopped = False
+        self._thread = threading.Thread(target=self._run, daemon=True, name="progress")
+        self._thread.start()
+
+    def update(self, key, downloaded, total=None, total_estimate=None):
+        """Record progress for a download; total falls back to the estimate."""
+        with self._lock:
+            tracker = self._trackers.get(key)
+            if tracker is None:
+                tracker = self._trackers[key] = _Tracker()
+            tracker.downloaded = downloaded
+            tracker.total = total or total_estimate or tracker.total
+        self._dirty.set()
+
+    def remove(self, key):
+        """Stop tracking a finished download."""
+        with self._lock:
+            self._trackers.pop(key, None)
+        self._dirty.set()
+
+    def stop(self):
+        self._stopped = True
+        self._dirty.set()
+
+    def snapshot(self):
+        """Advance the smoothed speeds and return a snapshot per download."""
+        now = time.perf_counter()
+        result = {}
+        with self._lock:
+            for key, tracker in self._trackers.items():
+                elapsed = now - tracker.last_time
+                if elapsed > 0:
+                    instant = max(tracker.downloaded - tracker.last_downloaded, 0) / elapsed
+                    if tracker.speed:
+                        tracker.speed += self.smoothing * (instant - tracker.speed)
+                    else:
+                        tracker.speed = instant
+                tracker.last_downloaded = tracker.downloaded
+                tracker.last_time = now
+
+                percent = None
+                eta = None
+                if tracker.total:
+                    percent = min(tracker.downloaded / tracker.total * 100, 100.0)
+                    if tracker.speed > 0:
+                        eta = max(tracker.total - tracker.downloaded, 0) / tracker.speed
+                result[key] = ProgressSnapshot(
+                    key, tracker.downloaded, tracker.total, percent, tracker.speed, eta
+                )
+        return result
+
+    def _run(self):
+        while True:
+            self._dirty.wait()
+            if self._stopped:
+                return
+            self._dirty.clear()
+            try:
+                self.on_tick(self.snapshot())
+            except Exception as e:
+                print(f"Error in progress callback: {e}")
+            time.sleep(self.interval)
@@ -96,6 +96,18 @@ class QueueManager:
     def has_next_song(self):
         return (self.loop_mode in ['loop_one', 'loop_all'] or 
                 self.current_index + 1 < len(self.queue))
+
+    def peek_next_song(self):
+        """Return the song get_next_song() would return, without advancing."""
+        if not self.queue:
+            return None
+        if self.loop_mode == 'loop_one':
+            return self.get_current_song()
+        if self.current_index + 1 < len(self.queue):
+            return self.queue[self.current_index + 1]
+        if self.loop_mode == 'loop_all':
+            return self.queue[0]
+        return None
     
     def get_all_songs(self):
         """
@@ -0,0 +1,67 @@
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+
+def default_transcode_workers():
+    """One conversion per core, leaving a core free for the UI and downloads."""
+    return max(1, (os.cpu_count() or 2) - 1)
+
+
+class Transcoder:
+    """Queue of pending FFmpeg conversions run N at a time.
+
+    Each conversion is its own FFmpeg process, so the pool only needs
+    threads to wait on them; the encoding itself runs in parallel on
+    separate cores. Every FFmpeg is limited to one thread so N jobs use
+    about N cores.
+    """
+
+    def __init__(self, downloader, max_workers=None):
+        self.downloader = downloader
+        self.max_workers = max_workers or default_transcode_workers()
+        self._pending = 0
+        self._lock = threading.Lock()
+        self._executor = ThreadPoolExecutor(
+            max_workers=self.max_workers, thread_name_prefix="transcode"
+        )
+
+    @property
+    def pending(self):
+        """Number of conversions queued or running."""
+        with self._lock:
+            return self._pending
+
+    def submit(self, input_file, profile=None, source_codec=None, delete_source=True, title=None,
+               job_key=None, cancel_event=None):
+        """Queue a conversion and return a Future for the output path.
+
+        Setting cancel_event stops the conversion even once FFmpeg runs.
+        """
+        with self._lock:
+            self._pending += 1
+        future = self._executor.submit(
+            self._convert, input_file, profile, source_codec, delete_source, title, job_key,
+            cancel_event
+        )
+        # Runs for finished and cancelled conversions alike
+        future.add_done_callback(self._on_done)
+        return future
+
+    def shutdown(self, wait=False):
+        self._executor.shutdown(wait=wait, cancel_futures=True)
+
+    def _on_done(self, future):
+        with self._lock:
+            self._pending -= 1
+
+    def _convert(self, input_file, profile, source_codec, delete_source, title, job_key,
+                 cancel_event):
+        with self.downloader.bind_job(job_key):
+            output_file = self.downloader.convert_to_mp3(
+                input_file, profile, source_codec, threads=1, title=title,
+                cancel_event=cancel_event
+            )
+        if delete_source:
+            self.downloader.remove_source(input_file)
+        return output_file
@@ -1,4 +1,29 @@
+import os
+
+# Folder the app downloads songs into and owns every file of
+MUSIC_DIR = os.path.join(os.getcwd(), "_music_")
+
+
 def format_duration(seconds):
     minutes = seconds // 60
     remaining_seconds = seconds % 60
-    return f"{minutes}:{remaining_seconds:02d}"
\ No newline at end of file
+    return f"{minutes}:{remaining_seconds:02d}"
+
+
+def percentile(values, pct):
+    """Linear-interpolated percentile of a list of numbers (pct in 0-100)."""
+    if not values:
+        return None
+    values = sorted(values)
+    rank = (len(values) - 1) * pct / 100.0
+    low = int(rank)
+    high = min(low + 1, len(values) - 1)
+    return values[low] + (values[high] - values[low]) * (rank - low)
+
+
+
+def is_inside(path, folder):
+    """Whether path is folder or somewhere below it."""
+    path = os.path.normcase(os.path.abspath(path))
+    folder = os.path.normcase(os.path.abspath(folder))
+    return path == folder or path.startswith(folder.rstrip(os.sep) + os.sep)
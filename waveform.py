@@ -0,0 +1,146 @@
+import os
+import hashlib
+import threading
+from concurrent.futures import ThreadPoolExecutor, wait as wait_all
+
+import numpy as np
+
+from utils import MUSIC_DIR, is_inside
+
+# Peaks stored per song, whatever its length
+WAVEFORM_BINS = 1000
+# Decoding rate for analysis; peaks don't need more than this
+ANALYSIS_SAMPLE_RATE = 8000
+# Sidecar file written next to each downloaded song
+PEAKS_SUFFIX = ".peaks.npy"
+# Folder inside the music folder for peaks of songs stored elsewhere
+PEAKS_DIR = "peaks"
+
+
+def peaks_path(file_path, music_dir=MUSIC_DIR):
+    """Path of the peak file that belongs to an audio file.
+
+    Songs in the music folder keep their peaks next to them. Songs
+    imported from elsewhere get a file in music_dir/peaks named after a
+    hash of their path, so the user's own folders are never written to.
+    """
+    if is_inside(file_path, music_dir):
+        return file_path + PEAKS_SUFFIX
+    key = hashlib.sha1(os.path.normcase(os.path.abspath(file_path)).encode('utf-8')).hexdigest()
+    return os.path.join(music_dir, PEAKS_DIR, key + PEAKS_SUFFIX)
+
+
+def compute_peaks(samples, bins=WAVEFORM_BINS):
+    """Reduce 16-bit PCM samples to `bins` peak levels scaled to 0-255."""
+    if samples.size == 0:
+        return np.zeros(bins, dtype=np.uint8)
+    # int32 so abs(-32768) doesn't overflow
+    levels = np.abs(samples.astype(np.int32))
+    if levels.size < bins:
+        levels = np.pad(levels, (0, bins - levels.size))
+    starts = np.linspace(0, levels.size, bins, endpoint=False).astype(np.int64)
+    peaks = np.maximum.reduceat(levels, starts)
+    loudest = peaks.max()
+    if loudest == 0:
+        return np.zeros(bins, dtype=np.uint8)
+    return (peaks * 255 // loudest).astype(np.uint8)
+
+
+def load_peaks(file_path):
+    """Memory-map the stored peaks for a song, or return None if missing."""
+    path = peaks_path(file_path)
+    if not os.path.exists(path):
+        return None
+    try:
+        return np.load(path, mmap_mode='r')
+    except (OSError, ValueError) as e:
+        print(f"Error loading waveform {path}: {e}")
+        return None
+
+
+def resample_peaks(peaks, width):
+    """Max-pool stored peaks down to `width` bars for display."""
+    width = min(width, len(peaks))
+    starts = np.linspace(0, len(peaks), width, endpoint=False).astype(np.int64)
+    return np.maximum.reduceat(np.asarray(peaks), starts)
+
+
+class WaveformAnalyzer:
+    """Decodes songs in the background and stores their waveform peaks.
+
+    Each song is decoded once with FFmpeg into low-rate mono PCM and
+    reduced to WAVEFORM_BINS peaks, saved as a small .npy file (see
+    peaks_path) so the UI can memory-map it instead of decoding audio.
+    """
+
+    def __init__(self, downloader, max_workers=1, on_ready=None):
+        self.downloader = downloader
+        self.on_ready = on_ready
+        self._executor = ThreadPoolExecutor(
+            max_workers=max_workers, thread_name_prefix="waveform"
+        )
+        self._pending = set()
+        self._lock = threading.Lock()
+
+    def submit(self, file_path):
+        """Queue a song for analysis unless it already has peaks."""
+        with self._lock:
+            if file_path in self._pending or os.path.exists(peaks_path(file_path)):
+                return None
+            self._pending.add(file_path)
+        return self._executor.submit(self._analyze, file_path)
+
+    def analyze(self, file_path):
+        """Decode one song, store its peaks and return them."""
+        pcm = self.downloader.decode_pcm(file_path, ANALYSIS_SAMPLE_RATE)
+        peaks = compute_peaks(np.frombuffer(pcm, dtype='<i2'))
+        path = peaks_path(file_path)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        temp_path = path + ".tmp"
+        with open(temp_path, 'wb') as f:
+            np.save(f, peaks)
+        os.replace(temp_path, path)
+        return peaks
+
+    def backfill(self, db, batch_size=50):
+        """Analyze every library song without peaks, one batch at a time.
+
+        Waiting for each batch keeps the queue short, so songs downloaded
+        while the backfill runs are not stuck behind the whole library.
+        Returns the number of songs analyzed.
+        """
+        analyzed = 0
+        after_id = 0
+        while True:
+            rows = db.get_song_paths(after_id, batch_size)
+            if not rows:
+                return analyzed
+            after_id = rows[-1][0]
+            futures = [
+                future
+                for future in (self.submit(file_path) for _, file_path in rows if os.path.exists(file_path))
+                if future is not None
+            ]
+            done, _ = wait_all(futures)
+            analyzed += sum(
+                1 for future in done if not future.cancelled() and future.result() is not None
+            )
+
+    def shutdown(self, wait=False):
+        self._executor.shutdown(wait=wait, cancel_futures=True)
+
+    def _analyze(self, file_path):
+        try:
+            peaks = self.analyze(file_path)
+        except Exception as e:
+            print(f"Error analyzing waveform for {file_path}: {e}")
+            return None
+        finally:
+            with self._lock:
+                self._pending.discard(file_path)
+        if self.on_ready:
+            try:
+                self.on_ready(file_path, peaks)
+            except Exception as e:
+                print(f"Error in waveform callback: {e}")
+        return peaks
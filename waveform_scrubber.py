@@ -0,0 +1,71 @@
+import flet as ft
+from waveform import load_peaks, resample_peaks
+
+# Horizontal inset of the slider track inside a Flet slider
+SLIDER_TRACK_INSET = 24
+
+
+class WaveformScrubber(ft.Container):
+    """Waveform bars drawn behind the seek slider.
+
+    The bars come from the peak file written by WaveformAnalyzer, so
+    showing a song never decodes audio. Bars left of the playback
+    position are drawn in the played color.
+    """
+
+    def __init__(self, slider, width=400, height=36, bar_width=3, spacing=1,
+                 color=ft.colors.with_opacity(0.35, ft.colors.WHITE),
+                 played_color=ft.colors.with_opacity(0.6, ft.colors.GREEN), **kwargs):
+        super().__init__(**kwargs)
+        self.slider = slider
+        self.bar_height = height
+        self.bar_width = bar_width
+        self.color = color
+        self.played_color = played_color
+        self.bar_count = (width - 2 * SLIDER_TRACK_INSET) // (bar_width + spacing)
+        self.file_path = None
+        self._played = 0
+
+        self.bars = ft.Row(
+            spacing=spacing,
+            alignment=ft.MainAxisAlignment.CENTER,
+            vertical_alignment=ft.CrossAxisAlignment.CENTER,
+        )
+        self.content = ft.Stack(
+            [
+                ft.Container(content=self.bars, height=height, alignment=ft.alignment.center),
+                slider,
+            ],
+            width=width,
+            alignment=ft.alignment.center,
+        )
+
+    def show(self, file_path):
+        """Draw the waveform for a song; returns False if it has no peaks yet."""
+        self.file_path = file_path
+        self._played = 0
+        peaks = load_peaks(file_path) if file_path else None
+        if peaks is None:
+            self.bars.controls = []
+            return False
+        self.bars.controls = [
+            ft.Container(
+                width=self.bar_width,
+                height=max(2, int(level) * self.bar_height // 255),
+                bgcolor=self.color,
+                border_radius=1,
+            )
+            for level in resample_peaks(peaks, self.bar_count)
+        ]
+        return True
+
+    def set_progress(self, fraction):
+        """Recolor only the bars whose played state changed."""
+        played = int(max(0.0, min(fraction, 1.0)) * len(self.bars.controls))
+        if played == self._played:
+            return
+        low, high = sorted((played, self._played))
+        color = self.played_color if played > self._played else self.color
+        for bar in self.bars.controls[low:high]:
+            bar.bgcolor = color
+        self._played = played
@@ -3,10 +3,52 @@ import os
 import re
 import subprocess
 import sys
+import threading
 import requests
+from contextlib import nullcontext
+from metadata_cache import video_id_from_url
+from pipeline_stats import (
+    NULL_TIMER, STAGE_INFO, STAGE_FETCH, STAGE_STREAM, STAGE_CONVERT, STAGE_THUMBNAIL,
+    STAGE_WAVEFORM, wait_with_cpu,
+)
+
+# Size of each ranged HTTP request when streaming (YouTube throttles
+# single long-lived requests, so the stream is fetched in slices)
+STREAM_RANGE_SIZE = 10 * 1024 * 1024
+STREAM_READ_SIZE = 64 * 1024
+
+# Downloads at least this large go through the resumable file path instead
+# of streaming, so a dropped connection does not restart them from zero
+RESUME_MIN_BYTES = 32 * 1024 * 1024
+
+# Named encoder profiles: output extension, FFmpeg audio arguments, and the
+# codec and bitrate (kbit/s, None for VBR) recorded in the library
+ENCODER_PROFILES = {
+    'mp3_192': {'ext': 'mp3', 'args': ['-acodec', 'libmp3lame', '-ab', '192k'],
+                'codec': 'mp3', 'bitrate': 192},
+    'mp3_v2': {'ext': 'mp3', 'args': ['-acodec', 'libmp3lame', '-q:a', '2'],
+               'codec': 'mp3', 'bitrate': None},
+    'opus_96': {'ext': 'opus', 'args': ['-acodec', 'libopus', '-b:a', '96k'],
+                'codec': 'opus', 'bitrate': 96},
+    'aac_128': {'ext': 'm4a', 'args': ['-acodec', 'aac', '-b:a', '128k'],
+                'codec': 'aac', 'bitrate': 128},
+}
+DEFAULT_PROFILE = 'mp3_192'
+
+# Passthrough remuxes the source stream without decoding. Only codecs VLC
+# plays natively are copied; anything else falls back to this profile.
+PASSTHROUGH = 'passthrough'
+PASSTHROUGH_CONTAINERS = {
+    'opus': 'opus',
+    'mp4a': 'm4a',
+    'aac': 'm4a',
+}
+PASSTHROUGH_FALLBACK = 'mp3_v2'
+
 
 class YouTubeDownloader:
-    def __init__(self):
+    def __init__(self, streaming=True, profile=DEFAULT_PROFILE, metadata_cache=None, journal=None,
+                 stats=None, ffmpeg_path=None):
         # Set downloads directory to _music_ folder in the app directory
         current_dir = os.getcwd()
         self.downloads_dir = os.path.join(current_dir, "_music_")
@@ -14,21 +56,50 @@ class YouTubeDownloader:
         # Ensure the _music_ folder exists, create if not
         os.makedirs(self.downloads_dir, exist_ok=True)
         
-        # Add cancel flag
+        # Add cancel flag (used when no per-job cancel event is given)
         self.cancel_flag = False
+
+        # Output paths reserved by downloads that are still running
+        self._reserved_paths = set()
+        self._reserve_lock = threading.Lock()
         
+        # Pipe downloaded bytes straight into FFmpeg instead of a temp .webm
+        self.streaming = streaming
+
+        # Encoder profile used when a download does not ask for one
+        self.profile = profile
+
+        # Optional MetadataCache so repeated lookups skip extract_info
+        self.metadata_cache = metadata_cache
+
+        # Optional DownloadJournal that makes file downloads resumable
+        self.journal = journal
+
+        # Optional PipelineStats that times every stage of a download
+        self.stats = stats
+
         # Setup FFmpeg path
-        self.setup_ffmpeg()
+        self.setup_ffmpeg(ffmpeg_path)
         
         # Configure YDL options
         self.ydl_opts = {
             'format': 'bestaudio/best',
             'outtmpl': os.path.join(self.downloads_dir, '%(title)s.%(ext)s'),
-            'restrictfilenames': True
+            'restrictfilenames': True,
+            # Keep .part files and continue them with range requests
+            'continuedl': True,
+            'http_chunk_size': STREAM_RANGE_SIZE,
         }
 
-    def setup_ffmpeg(self):
+    def setup_ffmpeg(self, ffmpeg_path=None):
         """Setup FFmpeg path for both development and packaged environments."""
+        if ffmpeg_path:
+            # Explicit binary, e.g. a system FFmpeg for benchmarks
+            if not os.path.exists(ffmpeg_path):
+                raise FileNotFoundError(f"FFmpeg not found at {ffmpeg_path}.")
+            self.ffmpeg_path = ffmpeg_path
+            return
+
         if getattr(sys, 'frozen', False):
             base_path = os.path.dirname(sys.executable)
         else:
@@ -40,6 +111,43 @@ class YouTubeDownloader:
         if not os.path.exists(self.ffmpeg_path):
             raise FileNotFoundError(f"FFmpeg not found in {ffmpeg_folder}. Please ensure it is properly placed.")
 
+    def stage_timer(self, stage, default_key=None):
+        """Timer for one pipeline stage (a no-op without stats)."""
+        if self.stats is None:
+            return NULL_TIMER
+        return self.stats.stage(stage, default_key)
+
+    def bind_job(self, job_key):
+        """Attribute stages timed on this thread to job_key."""
+        if self.stats is None:
+            return nullcontext()
+        return self.stats.bind(job_key)
+
+    def _start_ffmpeg(self, command, stdin=None, stdout=subprocess.DEVNULL):
+        """Start FFmpeg and drain its stderr on the side so it can never block.
+
+        Returns the process and a list that receives the stderr output.
+        """
+        process = subprocess.Popen(
+            command,
+            stdin=stdin,
+            stdout=stdout,
+            stderr=subprocess.PIPE,
+            **self._subprocess_options()
+        )
+        stderr_chunks = []
+        process.stderr_thread = threading.Thread(
+            target=lambda: stderr_chunks.append(process.stderr.read()), daemon=True
+        )
+        process.stderr_thread.start()
+        return process, stderr_chunks
+
+    def _finish_ffmpeg(self, process, stderr_chunks, timer):
+        """Wait for FFmpeg, charge its CPU time to timer and return its errors."""
+        timer.add_cpu(wait_with_cpu(process))
+        process.stderr_thread.join()
+        return b''.join(stderr_chunks).decode(errors='replace').strip()
+
     def log_error(self, message):
         """Log an error message."""
         print(f"ERROR: {message}")
@@ -51,118 +159,535 @@ class YouTubeDownloader:
         title = re.sub(r'[-\s]+', '_', title)
         return title[:100].strip('_')
 
-    def get_video_info(self, url):
-        """Retrieve information about the video."""
+    def get_video_info(self, url, refresh=False):
+        """Retrieve information about the video.
+
+        Results are served from the metadata cache when one is configured;
+        pass refresh=True to force a new extraction.
+        """
+        video_id = video_id_from_url(url)
+        if self.metadata_cache and video_id and not refresh:
+            cached = self.metadata_cache.get(video_id)
+            if cached is not None:
+                return cached
+
         try:
-            with yt_dlp.YoutubeDL(self.ydl_opts) as ydl:
+            with self.stage_timer(STAGE_INFO, video_id or url), yt_dlp.YoutubeDL(self.ydl_opts) as ydl:
                 info = ydl.extract_info(url, download=False)
                 sanitized_title = self.sanitize_filename(info['title'])
-                return {
+                result = {
+                    'id': info.get('id'),
                     'title': sanitized_title,
                     'duration': info['duration'],
                     'thumbnail': info['thumbnail'],
-                    'original_title': info['title']
+                    'original_title': info['title'],
+                    'uploader': info.get('uploader') or info.get('channel'),
+                    'tags': ', '.join(info.get('tags') or []) or None,
+                    # Selected audio format, used by the streaming download
+                    'stream_url': info.get('url'),
+                    'http_headers': info.get('http_headers') or {},
+                    'protocol': info.get('protocol'),
+                    'format_id': info.get('format_id'),
+                    'ext': info.get('ext'),
+                    'acodec': info.get('acodec'),
+                    'abr': info.get('abr'),
+                    'filesize': info.get('filesize'),
+                    'filesize_approx': info.get('filesize_approx'),
                 }
         except Exception as e:
             self.log_error(f"Error getting video info: {str(e)}")
             raise
 
+        if self.metadata_cache:
+            self.metadata_cache.put(result['id'] or video_id, result)
+        return result
+
     def cancel_download(self):
         """Cancel the current download."""
         self.cancel_flag = True
 
-    def convert_to_mp3(self, input_file):
-        """Convert the downloaded file to MP3."""
+    def _subprocess_options(self):
+        """Keyword arguments that keep FFmpeg from opening a console window."""
+        startupinfo = None
+        if os.name == 'nt':  # On Windows
+            startupinfo = subprocess.STARTUPINFO()
+            startupinfo.dwFlags |= subprocess.STARTF_USESHOWWINDOW
+        return {
+            'startupinfo': startupinfo,
+            'creationflags': subprocess.CREATE_NO_WINDOW if os.name == 'nt' else 0,
+        }
+
+    def _passthrough_ext(self, source_codec):
+        """Container extension for remuxing source_codec, or None if unsupported."""
+        if not source_codec:
+            return None
+        return PASSTHROUGH_CONTAINERS.get(source_codec.split('.')[0].lower())
+
+    def resolve_profile(self, profile=None, source_codec=None):
+        """Return the profile name that will actually be used for a source.
+
+        Passthrough only applies when the source codec can be copied into a
+        container VLC plays; otherwise PASSTHROUGH_FALLBACK is used.
+        """
+        profile = profile or self.profile
+        if profile == PASSTHROUGH:
+            return PASSTHROUGH if self._passthrough_ext(source_codec) else PASSTHROUGH_FALLBACK
+        if profile not in ENCODER_PROFILES:
+            raise ValueError(f"Unknown encoder profile: {profile}")
+        return profile
+
+    def profile_output(self, profile, source_codec=None):
+        """Return (extension, ffmpeg audio args) for a resolved profile."""
+        if profile == PASSTHROUGH:
+            return self._passthrough_ext(source_codec), ['-c:a', 'copy']
+        settings = ENCODER_PROFILES[profile]
+        return settings['ext'], list(settings['args'])
+
+    def audio_format(self, profile, source_codec=None, source_bitrate=None):
+        """Return (codec, kbit/s) of the audio a resolved profile produces."""
+        if profile == PASSTHROUGH:
+            codec = source_codec.split('.')[0].lower() if source_codec else None
+            if codec == 'mp4a':
+                codec = 'aac'
+            return codec, round(source_bitrate) if source_bitrate else None
+        settings = ENCODER_PROFILES[profile]
+        return settings['codec'], settings['bitrate']
+
+    def convert_to_mp3(self, input_file, profile=None, source_codec=None, threads=None, title=None,
+                       cancel_event=None):
+        """Convert the downloaded file with an encoder profile (MP3 by default).
+
+        With the passthrough profile the best audio stream is remuxed with
+        '-c:a copy' instead of being re-encoded. threads caps FFmpeg's own
+        thread count, which keeps parallel conversions from oversubscribing
+        the CPU. When title is given the output is named after it in the
+        music folder; otherwise it sits next to input_file. Setting
+        cancel_event kills FFmpeg and removes the partial output.
+        """
+        output_file = None
+        reserved = False
         try:
-            output_file = os.path.splitext(input_file)[0] + '.mp3'
+            profile = self.resolve_profile(profile, source_codec)
+            ext, audio_args = self.profile_output(profile, source_codec)
+            if title:
+                output_file = self.reserve_output_path(title, ext, sibling_exts=())
+                reserved = True
+            else:
+                output_file = os.path.splitext(input_file)[0] + '.' + ext
             command = [
                 self.ffmpeg_path,
                 '-i', input_file,
                 '-vn',  # No video
-                '-acodec', 'libmp3lame',
-                '-ab', '192k',
+                *audio_args,
+                *(['-threads', str(threads)] if threads else []),
                 '-y',
                 '-hide_banner',
                 '-loglevel', 'error',
                 output_file
             ]
 
-            startupinfo = None
-            if os.name == 'nt':  # On Windows
-                startupinfo = subprocess.STARTUPINFO()
-                startupinfo.dwFlags |= subprocess.STARTF_USESHOWWINDOW
-            
-            process = subprocess.run(
-                command,
-                stdout=subprocess.PIPE,
-                stderr=subprocess.PIPE,
-                startupinfo=startupinfo,
-                creationflags=subprocess.CREATE_NO_WINDOW if os.name == 'nt' else 0
-            )
-            
-            if not os.path.exists(output_file):
-                raise Exception("FFmpeg failed to create output file")
+            with self.stage_timer(STAGE_CONVERT, os.path.basename(input_file)) as timer:
+                process, stderr_chunks = self._start_ffmpeg(command)
+                if cancel_event is not None:
+                    threading.Thread(
+                        target=self._kill_on_cancel, args=(process, cancel_event), daemon=True
+                    ).start()
+                error = self._finish_ffmpeg(process, stderr_chunks, timer)
+                if cancel_event is not None and cancel_event.is_set():
+                    raise Exception("Download cancelled by user")
+                if not os.path.exists(output_file):
+                    raise Exception(f"FFmpeg failed to create output file: {error}")
+                timer.add_bytes(os.path.getsize(output_file))
             
-            print(f"Conversion to MP3 successful: {output_file}")
+            print(f"Conversion ({profile}) successful: {output_file}")
             return output_file
         except Exception as e:
-            self.log_error(f"Error converting to MP3: {str(e)}")
+            if "Download cancelled by user" in str(e):
+                if output_file and os.path.exists(output_file):
+                    os.remove(output_file)
+                self.log_error("Conversion cancelled by user")
+            else:
+                self.log_error(f"Error converting audio: {str(e)}")
             raise
+        finally:
+            if reserved:
+                self.release_output_path(output_file)
+
+    def _kill_on_cancel(self, process, cancel_event):
+        """Kill FFmpeg once cancel_event is set; return when it exits."""
+        while process.poll() is None:
+            if cancel_event.wait(0.2):
+                if process.poll() is None:
+                    process.kill()
+                return
+
+    def decode_pcm(self, input_file, sample_rate=8000):
+        """Decode an audio file to mono signed 16-bit little-endian PCM bytes."""
+        command = [
+            self.ffmpeg_path,
+            '-hide_banner',
+            '-loglevel', 'error',
+            '-i', input_file,
+            '-vn',
+            '-ac', '1',
+            '-ar', str(sample_rate),
+            '-f', 's16le',
+            'pipe:1',
+        ]
+        with self.stage_timer(STAGE_WAVEFORM, os.path.basename(input_file)) as timer:
+            process, stderr_chunks = self._start_ffmpeg(command, stdout=subprocess.PIPE)
+            pcm_chunks = []
+            reader = threading.Thread(
+                target=lambda: pcm_chunks.append(process.stdout.read()), daemon=True
+            )
+            reader.start()
+            error = self._finish_ffmpeg(process, stderr_chunks, timer)
+            reader.join()
+            if process.returncode != 0:
+                raise Exception(f"FFmpeg failed to decode {input_file}: {error}")
+            timer.add_bytes(os.path.getsize(input_file))
+        return b''.join(pcm_chunks)
+
+    def remove_source(self, source_file):
+        """Delete a converted source file and its journal entry."""
+        os.remove(source_file)
+        if self.journal and os.path.dirname(source_file) == self.journal.partial_dir:
+            self.journal.finish(source_file)
 
     def download_thumbnail(self, thumbnail_url, title):
         """Download the thumbnail and save it as an MP3 file."""
         try:
-            response = requests.get(thumbnail_url, stream=True)
-            if response.status_code == 200:
-                sanitized_title = self.sanitize_filename(title)
-                thumbnail_path = os.path.join(self.downloads_dir, f"{sanitized_title}_thumbnail.jpg")
-                with open(thumbnail_path, 'wb') as f:
-                    f.write(response.content)
-                print(f"Thumbnail saved as MP3: {thumbnail_path}")
-                return thumbnail_path
-            else:
-                self.log_error("Failed to download thumbnail.")
+            with self.stage_timer(STAGE_THUMBNAIL, title) as timer:
+                response = requests.get(thumbnail_url, stream=True)
+                if response.status_code == 200:
+                    sanitized_title = self.sanitize_filename(title)
+                    thumbnail_path = os.path.join(self.downloads_dir, f"{sanitized_title}_thumbnail.jpg")
+                    with open(thumbnail_path, 'wb') as f:
+                        f.write(response.content)
+                    timer.add_bytes(len(response.content))
+                    print(f"Thumbnail saved as MP3: {thumbnail_path}")
+                    return thumbnail_path
+                else:
+                    timer.fail(f"HTTP {response.status_code}")
+                    self.log_error("Failed to download thumbnail.")
         except Exception as e:
             self.log_error(f"Error downloading thumbnail: {str(e)}")
             raise
 
-    def download(self, url, progress_callback=None):
-        """Download a YouTube video and convert it to MP3."""
-        self.cancel_flag = False
+    def reserve_output_path(self, sanitized_title, ext, sibling_exts=('mp3',)):
+        """Pick an unused output path and reserve it for the calling job.
+
+        A name is only free when neither the file itself nor its siblings
+        (e.g. the converted audio file) exist, so a new download never overwrites
+        a finished song with the same title.
+        """
+        with self._reserve_lock:
+            counter = 0
+            while True:
+                stem = sanitized_title if counter == 0 else f"{sanitized_title}_{counter}"
+                output_file = os.path.join(self.downloads_dir, f"{stem}.{ext}")
+                taken = output_file in self._reserved_paths or any(
+                    os.path.exists(os.path.join(self.downloads_dir, f"{stem}.{e}"))
+                    for e in (ext,) + tuple(sibling_exts)
+                )
+                if not taken:
+                    self._reserved_paths.add(output_file)
+                    return output_file
+                counter += 1
+
+    def release_output_path(self, output_file):
+        """Release a path reserved by reserve_output_path."""
+        with self._reserve_lock:
+            self._reserved_paths.discard(output_file)
+
+    def _cancel_checker(self, cancel_event):
+        """Return a function telling whether the current download was cancelled."""
+        if cancel_event is None:
+            self.cancel_flag = False
+
+        def is_cancelled():
+            if cancel_event is not None:
+                return cancel_event.is_set()
+            return self.cancel_flag
+        return is_cancelled
+
+    def can_stream(self, info):
+        """Whether the selected format is a plain HTTP(S) file that can be piped."""
+        return info.get('protocol') in ('http', 'https')
+
+    def wants_resume(self, info):
+        """Whether a download should use the resumable file path.
+
+        True for videos with a partial download in the journal and for
+        sources of at least RESUME_MIN_BYTES.
+        """
+        if not self.journal or not info.get('id'):
+            return False
+        if self.journal.get(info['id']):
+            return True
+        size = info.get('filesize') or info.get('filesize_approx')
+        if not size and info.get('duration'):
+            size = info['duration'] * 24000  # roughly 192 kbit/s
+        return bool(size) and size >= RESUME_MIN_BYTES
+
+    def selected_format_result(self, url, info):
+        """A minimal yt-dlp result holding only the selected format, or None.
+
+        Passed to process_ie_result, it lets yt-dlp download a video whose
+        info is already known without running extraction again. Only plain
+        HTTP(S) formats qualify; info cached before format_id was recorded,
+        or whose stream URL has expired, returns None.
+        """
+        if not (self.can_stream(info) and info.get('stream_url') and info.get('format_id')):
+            return None
+        return {
+            'id': info['id'],
+            'title': info.get('original_title') or info['title'],
+            'webpage_url': url,
+            'extractor': 'youtube',
+            'extractor_key': 'Youtube',
+            'duration': info.get('duration'),
+            'formats': [{
+                'format_id': info['format_id'],
+                'url': info['stream_url'],
+                'ext': info.get('ext') or 'webm',
+                'protocol': info['protocol'],
+                'acodec': info.get('acodec'),
+                'vcodec': 'none',
+                'abr': info.get('abr'),
+                'filesize': info.get('filesize'),
+                'filesize_approx': info.get('filesize_approx'),
+                'http_headers': info.get('http_headers') or {},
+            }],
+        }
+
+    def should_stream(self, info):
+        """Whether download() will pipe this video straight into FFmpeg."""
+        return self.streaming and self.can_stream(info) and not self.wants_resume(info)
+
+    def stream_to_mp3(self, url, progress_callback=None, cancel_event=None, info=None, profile=None):
+        """Download the audio and encode it in a single pass.
+
+        The selected format is fetched in ranged slices and written to
+        FFmpeg's stdin as it arrives, so encoding overlaps the transfer and
+        no intermediate .webm is written to disk.
+        """
+        if info is None:
+            info = self.get_video_info(url)
+        if not info.get('stream_url'):
+            # Cached info whose signed stream URL has expired
+            info = self.get_video_info(url, refresh=True)
+        if not self.can_stream(info) or not info.get('stream_url'):
+            return self.download(url, progress_callback, cancel_event, info, stream=False, profile=profile)
+
+        is_cancelled = self._cancel_checker(cancel_event)
+        output_file = None
+        process = None
+        try:
+            sanitized_title = info['title']
+            profile = self.resolve_profile(profile, info.get('acodec'))
+            ext, audio_args = self.profile_output(profile, info.get('acodec'))
+            output_file = self.reserve_output_path(sanitized_title, ext, sibling_exts=())
+
+            command = [
+                self.ffmpeg_path,
+                '-i', 'pipe:0',
+                '-vn',  # No video
+                *audio_args,
+                '-y',
+                '-hide_banner',
+                '-loglevel', 'error',
+                output_file
+            ]
+            with self.stage_timer(STAGE_STREAM, info.get('id') or url) as timer:
+                process, stderr_chunks = self._start_ffmpeg(command, stdin=subprocess.PIPE)
+
+                headers = dict(info.get('http_headers') or {})
+                total = info.get('filesize')
+                downloaded = 0
+                with requests.Session() as session:
+                    while total is None or downloaded < total:
+                        if is_cancelled():
+                            raise Exception("Download cancelled by user")
+                        start = downloaded
+                        end = start + STREAM_RANGE_SIZE - 1
+                        if total is not None:
+                            end = min(end, total - 1)
+                        headers['Range'] = f"bytes={start}-{end}"
+                        with session.get(info['stream_url'], headers=headers, stream=True, timeout=30) as response:
+                            if response.status_code == 416 and start:
+                                # Asked past the end of a stream of unknown length
+                                break
+                            response.raise_for_status()
+                            content_range = response.headers.get('Content-Range', '')
+                            if response.status_code == 206:
+                                if not content_range.startswith(f"bytes {start}-"):
+                                    raise Exception(f"Unexpected Content-Range: {content_range!r}")
+                                if '/' in content_range and content_range.rsplit('/', 1)[1].isdigit():
+                                    total = int(content_range.rsplit('/', 1)[1])
+                            elif start:
+                                # A full response now would feed FFmpeg the audio from byte 0 again
+                                raise Exception(
+                                    f"Server ignored the Range header (HTTP {response.status_code})"
+                                )
+                            received = 0
+                            for chunk in response.iter_content(STREAM_READ_SIZE):
+                                if is_cancelled():
+                                    raise Exception("Download cancelled by user")
+                                process.stdin.write(chunk)
+                                received += len(chunk)
+                                downloaded += len(chunk)
+                                timer.add_bytes(len(chunk))
+                                if progress_callback:
+                                    progress = min(downloaded / total * 100, 100) if total else 0
+                                    progress_callback(progress, downloaded, total)
+                        # Whole file in one response, or a short slice at the end of the stream
+                        if response.status_code != 206 or received < end - start + 1:
+                            break
+                if total is not None and downloaded < total:
+                    raise Exception(f"Stream ended early at {downloaded} of {total} bytes")
+
+                process.stdin.close()
+                error = self._finish_ffmpeg(process, stderr_chunks, timer)
+                if process.returncode != 0 or not os.path.exists(output_file):
+                    raise Exception(f"FFmpeg failed to create output file: {error}")
+
+            print(f"Streamed conversion ({profile}) successful: {output_file}")
+            thumbnail = self.download_thumbnail(info['thumbnail'], sanitized_title)
+            return output_file, thumbnail
+        except Exception as e:
+            if process is not None and process.poll() is None:
+                process.kill()
+                process.wait()
+            if output_file and os.path.exists(output_file):
+                os.remove(output_file)
+            if "Download cancelled by user" in str(e):
+                self.log_error("Download cancelled by user")
+            else:
+                self.log_error(f"Error streaming download: {str(e)}")
+            raise
+        finally:
+            if output_file:
+                self.release_output_path(output_file)
+
+    def fetch_source(self, url, progress_callback=None, cancel_event=None, info=None, profile=None):
+        """Download the best audio stream with yt-dlp and return its path.
+
+        The file is not converted; pass it to convert_to_mp3 (directly or via
+        a Transcoder) and then to remove_source. With a journal the file goes
+        to a stable per-video path, so a cancelled or interrupted download
+        resumes from its .part file on the next attempt.
+        """
+        is_cancelled = self._cancel_checker(cancel_event)
+        journaled = False
 
         def progress_hook(d):
-            if self.cancel_flag:
+            if is_cancelled():
                 raise Exception("Download cancelled by user")
-            if d['status'] == 'downloading' and progress_callback:
-                progress = (d.get('downloaded_bytes', 0) / d.get('total_bytes', 1)) * 100
-                progress_callback(progress)
+            if d['status'] == 'downloading':
+                total = d.get('total_bytes') or d.get('total_bytes_estimate')
+                if journaled:
+                    self.journal.record(
+                        info['id'], url, output_file, d.get('downloaded_bytes', 0), total
+                    )
+                if progress_callback:
+                    downloaded = d.get('downloaded_bytes', 0)
+                    progress = min(downloaded / total * 100, 100) if total else 0
+                    progress_callback(progress, downloaded, total)
 
+        output_file = None
         try:
-            info = self.get_video_info(url)
+            if info is None:
+                info = self.get_video_info(url)
             sanitized_title = info['title']
 
-            output_file = os.path.join(self.downloads_dir, f"{sanitized_title}.webm")
-            counter = 1
-            while os.path.exists(output_file):
-                output_file = os.path.join(self.downloads_dir, f"{sanitized_title}_{counter}.webm")
-                counter += 1
-            
-            self.ydl_opts['outtmpl'] = output_file
-            self.ydl_opts['progress_hooks'] = [progress_hook]
+            if is_cancelled():
+                raise Exception("Download cancelled by user")
 
-            with yt_dlp.YoutubeDL(self.ydl_opts) as ydl:
-                ydl.download([url])
-            
-            mp3_file = self.convert_to_mp3(output_file)
-            # Clean up the original file
-            os.remove(output_file)
-            # Download the thumbnail 
-            thumbnail = self.download_thumbnail(info['thumbnail'], sanitized_title)
-       
-            return mp3_file, thumbnail  # Return as a tuple
+            if self.journal and info.get('id'):
+                output_file = self.journal.partial_path(info['id'])
+                with self._reserve_lock:
+                    if output_file in self._reserved_paths:
+                        output_file = None
+                        raise Exception("This video is already being downloaded")
+                    self._reserved_paths.add(output_file)
+                journaled = True
+                entry = self.journal.get(info['id'])
+                self.journal.record(
+                    info['id'], url, output_file,
+                    entry[3] if entry else 0, entry[4] if entry else None, force=True
+                )
+            else:
+                profile = self.resolve_profile(profile, info.get('acodec'))
+                ext, _ = self.profile_output(profile, info.get('acodec'))
+                output_file = self.reserve_output_path(sanitized_title, 'webm', sibling_exts=(ext,))
+
+            ydl_opts = dict(self.ydl_opts)
+            ydl_opts['outtmpl'] = output_file
+            ydl_opts['progress_hooks'] = [progress_hook]
+
+            # Bytes already on disk from an earlier attempt are not counted
+            part_file = output_file + '.part'
+            resumed_bytes = os.path.getsize(part_file) if os.path.exists(part_file) else 0
+
+            ie_result = self.selected_format_result(url, info)
+            with self.stage_timer(STAGE_FETCH, info.get('id') or url) as timer, yt_dlp.YoutubeDL(ydl_opts) as ydl:
+                if ie_result is not None:
+                    # Info is already known: download without extracting again
+                    ydl.process_ie_result(ie_result, download=True)
+                else:
+                    ydl.download([url])
+                if os.path.exists(output_file):
+                    timer.add_bytes(max(os.path.getsize(output_file) - resumed_bytes, 0))
+
+            if is_cancelled():
+                raise Exception("Download cancelled by user")
+
+            return output_file
         except Exception as e:
             if "Download cancelled by user" in str(e):
                 self.log_error("Download cancelled by user")
             else:
                 self.log_error(f"Error downloading: {str(e)}")
-            raise
\ No newline at end of file
+            raise
+        finally:
+            # The file itself now marks the name as taken
+            if output_file:
+                self.release_output_path(output_file)
+
+    def source_title(self, source_file, info):
+        """Title to name the converted file after, or None to keep the source name."""
+        if self.journal and os.path.dirname(source_file) == self.journal.partial_dir:
+            return info['title']
+        return None
+
+    def download(self, url, progress_callback=None, cancel_event=None, info=None, stream=None, profile=None):
+        """Download a YouTube video and convert it with an encoder profile.
+
+        Each call builds its own yt-dlp options, so several downloads can run
+        at once. Pass a threading.Event as cancel_event to cancel this call
+        only; without one the shared cancel_flag is used. progress_callback
+        receives (percent, downloaded_bytes, total_bytes); total_bytes falls
+        back to yt-dlp's estimate and may be None. When streaming is
+        enabled (the default, see should_stream) small plain HTTP formats skip
+        the temporary .webm file.
+        """
+        if info is None:
+            info = self.get_video_info(url)
+        if stream is None:
+            stream = self.should_stream(info)
+        if stream:
+            return self.stream_to_mp3(url, progress_callback, cancel_event, info, profile)
+
+        profile = self.resolve_profile(profile, info.get('acodec'))
+
+        output_file = self.fetch_source(url, progress_callback, cancel_event, info, profile)
+        audio_file = self.convert_to_mp3(
+            output_file, profile, info.get('acodec'), title=self.source_title(output_file, info)
+        )
+        # Clean up the original file
+        self.remove_source(output_file)
+        # Download the thumbnail 
+        thumbnail = self.download_thumbnail(info['thumbnail'], info['title'])
+
+        return audio_file, thumbnail  # Return as a tuple